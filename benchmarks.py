@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CSV_DTYPES, ensure_columnar_cache, load_columns, write_synthetic_csv
+from fast_forest import FlatForest, benchmark_single_row
+from preprocessing import FeaturePipeline
+from scoring import FEATURE_COLUMNS, SCALED_COLUMNS
+
+warnings.filterwarnings('ignore')
+
+# --- BANC D'ESSAI ---
+# Mesures reproductibles sur un dataset synthétique au schéma de creditcard.csv :
+# chargement CSV vs colonnaire, démarrage à froid du bundle, latence unitaire, débit par taille de lot,
+# pic mémoire, temps d'entraînement / validation croisée / recherche d'hyperparamètres.
+# Les résultats sont écrits en JSON pour comparer les builds successifs (--compare).
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+DEFAULT_BATCH_SIZES = [1, 64, 1024, 16384]
+
+
+def _best_of(func, repeat=3):
+    """ Meilleur temps (s) sur `repeat` exécutions, et le résultat de la dernière """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def _peak_memory_mb(func):
+    """
+    Pic des allocations du tas Python/NumPy (tracemalloc) pendant l'appel, en Mo.
+    Ne voit ni pyarrow ni les pages mappées : pour le chargement, voir _max_rss_mb.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+_RSS_SCRIPT = """
+import json, sys
+import pandas as pd
+from data_loader import CSV_DTYPES, load_columns
+
+def max_rss_mb():
+    # Linux : VmHWM, propre au processus (ru_maxrss garde le pic du parent après fork/exec)
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if sys.platform == 'win32':
+        # Windows : PeakWorkingSetSize de GetProcessMemoryInfo
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in ['PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                                                     'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage',
+                                                     'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage']]
+
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        ctypes.windll.kernel32.K32GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                       ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 2 ** 20
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Ko sous Linux, octets sous macOS
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 1024
+
+mode, csv_path = sys.argv[1], sys.argv[2]
+if mode != 'baseline':
+    df = pd.read_csv(csv_path, dtype=CSV_DTYPES) if mode == 'csv' else load_columns(csv_path=csv_path)
+    # Toutes les colonnes sont lues : les pages mappées du cache comptent comme la mémoire du CSV
+    df.sum(numeric_only=True)
+print(json.dumps({'max_rss_mb': max_rss_mb()}))
+"""
+
+
+def _max_rss_mb(mode, csv_path):
+    """ Pic de RSS (Mo) d'un nouveau processus : imports seuls ('baseline') ou chargement CSV / colonnaire """
+    output = subprocess.run(
+        [sys.executable, '-c', _RSS_SCRIPT, mode, os.path.abspath(csv_path)],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])['max_rss_mb']
+
+
+# --- MESURES ---
+
+def bench_loading(csv_path, repeat=3):
+    """ Lecture complète CSV typé vs cache Feather (conversion mesurée à part) """
+    csv_s, _ = _best_of(lambda: pd.read_csv(csv_path, dtype=CSV_DTYPES), repeat)
+    start = time.perf_counter()
+    ensure_columnar_cache(csv_path)
+    cache_build_s = time.perf_counter() - start
+    columnar_s, _ = _best_of(lambda: load_columns(csv_path=csv_path), repeat)
+    kpi_columns_s, _ = _best_of(lambda: load_columns(['Class', 'Amount'], csv_path=csv_path), repeat)
+    return {
+        'csv_s': csv_s,
+        'columnar_cache_build_s': cache_build_s,
+        'columnar_s': columnar_s,
+        'columnar_kpi_columns_s': kpi_columns_s,
+        'speedup': csv_s / columnar_s if columnar_s > 0 else None
+    }
+
+
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import numpy as np
+from model_bundle import load_bundle
+imported = time.perf_counter()
+bundle = load_bundle(sys.argv[1])
+loaded = time.perf_counter()
+bundle.forest.predict_proba(np.zeros((1, len(bundle.feature_names)), dtype=np.float32))
+first = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'load_s': loaded - imported, 'first_predict_s': first - loaded}))
+"""
+
+
+def bench_cold_start(bundle_path, repeat=3):
+    """ Nouveau processus : imports + chargement du bundle (memory map) + première prédiction """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', _COLD_START_SCRIPT, os.path.abspath(bundle_path)],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run['process_s'] = time.perf_counter() - start
+        runs.append(run)
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+
+def bench_batch_throughput(model, flat_forest, X, batch_sizes=DEFAULT_BATCH_SIZES, min_time=0.5):
+    """ Transactions/s par taille de lot, sklearn et forêt aplatie """
+    results = {}
+    for size in batch_sizes:
+        batch = X[:size] if size <= len(X) else np.resize(X, (size, X.shape[1]))
+        results[str(size)] = {}
+        for name, engine in (('sklearn', model), ('flat_forest', flat_forest)):
+            n_calls, start = 0, time.perf_counter()
+            while True:
+                engine.predict_proba(batch)
+                n_calls += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+            results[str(size)][name] = {
+                'rows_per_s': n_calls * size / elapsed,
+                'ms_per_batch': elapsed / n_calls * 1000
+            }
+    return results
+
+
+def bench_memory(csv_path, model, flat_forest, X):
+    """
+    Pic mémoire (Mo) : hausse du pic de RSS d'un processus dédié pour le chargement (CSV vs cache
+    colonnaire, pyarrow et pages mappées compris), tas Python/NumPy seulement (tracemalloc) pour le scoring
+    """
+    ensure_columnar_cache(csv_path)
+    baseline = _max_rss_mb('baseline', csv_path)
+    return {
+        'csv_load_rss_mb': _max_rss_mb('csv', csv_path) - baseline,
+        'columnar_load_rss_mb': _max_rss_mb('columnar', csv_path) - baseline,
+        'sklearn_batch_heap_mb': _peak_memory_mb(lambda: model.predict_proba(X)),
+        'flat_forest_batch_heap_mb': _peak_memory_mb(lambda: flat_forest.predict_proba(X))
+    }
+
+
+def bench_training(X, y, n_trees, random_state=42):
+    """ Entraînement seul, validation croisée en un passage, recherche par divisions successives """
+    from sklearn.ensemble import RandomForestClassifier
+    from evaluation import cross_validate_once
+    from tuning import SuccessiveHalvingSearch
+
+    rf = RandomForestClassifier(n_estimators=n_trees, random_state=random_state, n_jobs=-1)
+    start = time.perf_counter()
+    rf.fit(X, y)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cross_validate_once(rf, X, y, cv_folds=3, random_state=random_state)
+    cv_s = time.perf_counter() - start
+
+    param_grid = {'n_estimators': [n_trees], 'max_depth': [10, None], 'min_samples_split': [2, 5],
+                  'class_weight': [None, 'balanced']}
+    search = SuccessiveHalvingSearch(
+        RandomForestClassifier(random_state=random_state), param_grid,
+        cv=3, checkpoint_path=None, random_state=random_state, verbose=0
+    ).fit(X, y)
+    return {'fit_s': fit_s, 'cv_s': cv_s, 'tuning_s': search.wall_time_}
+
+
+# --- ORCHESTRATION ---
+
+def _environment():
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def run_benchmarks(n_rows=100_000, n_trees=50, batch_sizes=DEFAULT_BATCH_SIZES, train_rows=50_000,
+                   skip_training=False, repeat=3, random_state=42, workdir=None):
+    """ Génère le dataset, entraîne et exporte un modèle de référence, puis exécute toutes les mesures """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import RobustScaler
+    from model_bundle import save_bundle
+
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='bench_')
+    try:
+        csv_path = write_synthetic_csv(os.path.join(workdir, 'creditcard.csv'), n_rows, random_state=random_state)
+        results = {'loading': bench_loading(csv_path, repeat)}
+
+        df = load_columns(csv_path=csv_path)
+        scaler = RobustScaler().fit(df[SCALED_COLUMNS])
+        X = FeaturePipeline.from_scaler(scaler, FEATURE_COLUMNS).transform_frame(df)
+        y = df['Class'].to_numpy()
+        train = np.random.default_rng(random_state).permutation(len(X))[:train_rows]
+
+        model = RandomForestClassifier(n_estimators=n_trees, random_state=random_state, n_jobs=-1)
+        model.fit(X.iloc[train], y[train])
+        bundle_path = save_bundle(model, scaler, FEATURE_COLUMNS, path=os.path.join(workdir, 'bundle'))
+        flat_forest = FlatForest.from_sklearn(model)
+        X_arr = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+
+        results['cold_start'] = bench_cold_start(bundle_path, repeat)
+        results['single_row'] = benchmark_single_row(model, flat_forest, X_arr, n_iter=500)
+        results['batch_throughput'] = bench_batch_throughput(model, flat_forest, X_arr, batch_sizes)
+        results['memory'] = bench_memory(csv_path, model, flat_forest, X_arr[:max(batch_sizes)])
+        if not skip_training:
+            results['training'] = bench_training(X.iloc[train], y[train], n_trees, random_state)
+
+        return {
+            'environment': _environment(),
+            'config': {'n_rows': n_rows, 'n_trees': n_trees, 'train_rows': int(len(train)),
+                       'batch_sizes': list(batch_sizes), 'repeat': repeat, 'random_state': random_state},
+            'results': results
+        }
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def save_results(report, output_dir=DEFAULT_RESULTS_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = report['environment']['timestamp'].replace(':', '').replace('-', '')
+    path = os.path.join(output_dir, f"bench_{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+    return path
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare_results(previous, current, tolerance=0.10):
+    """
+    Compare deux rapports métrique par métrique ; retourne les régressions au-delà de `tolerance`.
+    Pour les débits (rows_per_s, speedup) plus haut est meilleur, pour le reste plus bas est meilleur.
+    """
+    old, new = _flatten(previous['results']), _flatten(current['results'])
+    regressions = []
+    print(f"{'Métrique':<52s}{'avant':>12s}{'après':>12s}{'ratio':>8s}")
+    for name in sorted(old.keys() & new.keys()):
+        ratio = new[name] / old[name] if old[name] else float('nan')
+        higher_is_better = name.endswith(('rows_per_s', 'speedup'))
+        worse = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+        flag = '  <- régression' if worse else ''
+        if worse:
+            regressions.append(name)
+        print(f"{name:<52s}{old[name]:>12.4g}{new[name]:>12.4g}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai reproductible des chemins de scoring et d'entraînement")
+    parser.add_argument('--rows', type=int, default=100_000, help="Taille du dataset synthétique")
+    parser.add_argument('--trees', type=int, default=50)
+    parser.add_argument('--train-rows', type=int, default=50_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-training', action='store_true', help="Ne pas mesurer fit / CV / tuning")
+    parser.add_argument('--output-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--compare', help="Rapport JSON précédent à comparer")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.rows, args.trees, args.batch_sizes, args.train_rows,
+                            args.skip_training, args.repeat)
+    path = save_results(report, args.output_dir)
+    print(f"Résultats écrits dans {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(json.load(f), report)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) détectée(s)")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from fast_forest import FlatForest
+
+# --- CASCADE DE SCORING ---
+# Étage 1 : régression logistique sur quelques features très discriminantes (un produit scalaire
+# par transaction). Seules les transactions dont la marge dépasse un seuil calibré pour préserver
+# le rappel passent à l'étage 2, la forêt complète. Les autres reçoivent la probabilité `cleared_proba`.
+STAGE1_FEATURES = ['V14', 'V17', 'V12', 'V10', 'Amount']
+# Part des transactions à garder (fraudes + transactions signalées par la forêt) sur le jeu de calibration
+DEFAULT_TARGET_RECALL = 0.995
+CASCADE_FILE = 'cascade.json'
+REPORT_FILE = 'cascade_report.json'
+
+
+def forest_fingerprint(forest):
+    """ Empreinte des seuils de la forêt : le seuil de l'étage 1 n'est valable que pour cette forêt """
+    return hashlib.sha1(np.ascontiguousarray(forest.threshold).tobytes()).hexdigest()
+
+
+class LinearPrefilter:
+    """ Étage 1 : marge linéaire sur les colonnes `columns` du lot normalisé """
+
+    def __init__(self, columns, coef, intercept, cut=-np.inf, feature_names=None):
+        self.columns = list(columns)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.cut = float(cut)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.idx = (np.array([self.feature_names.index(c) for c in self.columns])
+                    if self.feature_names is not None else np.arange(len(self.columns)))
+
+    @classmethod
+    def fit(cls, X, y, feature_names, columns=STAGE1_FEATURES, C=1.0):
+        """ X : lot normalisé (ordre de `feature_names`) ; classes équilibrées pour ne pas ignorer la fraude """
+        from sklearn.linear_model import LogisticRegression
+
+        idx = [list(feature_names).index(c) for c in columns]
+        model = LogisticRegression(C=C, class_weight='balanced', max_iter=1000)
+        model.fit(np.asarray(X)[:, idx].astype(np.float64), y)
+        return cls(columns, model.coef_[0], model.intercept_[0], feature_names=feature_names)
+
+    def margin(self, X):
+        return np.asarray(X)[:, self.idx].astype(np.float64) @ self.coef + self.intercept
+
+    def calibrate(self, X, must_pass, target_recall=DEFAULT_TARGET_RECALL):
+        """ Seuil le plus haut qui laisse passer `target_recall` des lignes `must_pass` """
+        margins = np.sort(self.margin(np.asarray(X)[np.asarray(must_pass, dtype=bool)]))
+        if not len(margins):
+            raise ValueError("Aucune ligne à préserver pour calibrer l'étage 1")
+        self.cut = float(margins[int(np.floor((1 - target_recall) * len(margins)))])
+        return self.cut
+
+    def to_dict(self):
+        return {'columns': self.columns, 'coef': self.coef.tolist(), 'intercept': self.intercept,
+                'cut': self.cut, 'feature_names': self.feature_names}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['columns'], data['coef'], data['intercept'], data['cut'], data['feature_names'])
+
+
+class CascadeModel:
+    """ Même interface que la forêt (predict_proba, classes_, feature_names_in_) : utilisable partout à sa place """
+
+    def __init__(self, prefilter, forest, cleared_proba=0.0):
+        self.prefilter = prefilter
+        self.forest = forest if isinstance(forest, FlatForest) else FlatForest.from_sklearn(forest)
+        self.cleared_proba = float(cleared_proba)
+        self.classes_ = self.forest.classes_
+        self.feature_names_in_ = self.forest.feature_names_in_
+        # Suivi : part du trafic réellement envoyée à la forêt
+        self.n_seen = 0
+        self.n_forwarded = 0
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        candidates = np.flatnonzero(self.prefilter.margin(X) >= self.prefilter.cut)
+        proba = np.empty((len(X), 2))
+        proba[:, 0] = 1.0 - self.cleared_proba
+        proba[:, 1] = self.cleared_proba
+        if len(candidates):
+            proba[candidates] = self.forest.predict_proba(X[candidates])
+        self.n_seen += len(X)
+        self.n_forwarded += len(candidates)
+        return proba
+
+    @property
+    def forward_rate(self):
+        return self.n_forwarded / self.n_seen if self.n_seen else None
+
+
+def save_cascade(prefilter, forest, path, **details):
+    """ Écrit l'étage 1 à côté du modèle (ex. dans le dossier du bundle) """
+    data = {**prefilter.to_dict(), 'forest_fingerprint': forest_fingerprint(forest), **details}
+    file_path = os.path.join(path, CASCADE_FILE) if os.path.isdir(path) else path
+    with open(file_path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(file_path + '.tmp', file_path)
+    return file_path
+
+
+def load_cascade(path, forest, cleared_proba=0.0):
+    """ Cascade pour cette forêt, ou None si aucun étage 1 n'a été calibré pour elle """
+    file_path = os.path.join(path, CASCADE_FILE) if os.path.isdir(path) else path
+    try:
+        with open(file_path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    forest = forest if isinstance(forest, FlatForest) else FlatForest.from_sklearn(forest)
+    if data.get('forest_fingerprint') != forest_fingerprint(forest):
+        # Modèle ré-entraîné depuis la calibration : on retombe sur la forêt seule
+        return None
+    return CascadeModel(LinearPrefilter.from_dict(data), forest, cleared_proba)
+
+
+# --- RAPPORT HORS LIGNE ---
+
+def _best_time(func, repeats=3):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _detection(y_true, proba, threshold):
+    y_pred = proba >= threshold
+    tp = int((y_pred & (y_true == 1)).sum())
+    return {
+        'recall': tp / max(int((y_true == 1).sum()), 1),
+        'precision': tp / max(int(y_pred.sum()), 1),
+        'flagged': int(y_pred.sum()),
+        'true_positives': tp
+    }
+
+
+def build_cascade(csv_path='creditcard.csv', bundle_path='modele_fraude_bundle', target_recall=DEFAULT_TARGET_RECALL,
+                  columns=STAGE1_FEATURES, calibration_size=0.3, test_size=0.3, random_state=42):
+    """
+    Entraîne et calibre l'étage 1 sur la partie entraînement du split du notebook
+    (test_size=0.3, stratifié, random_state=42), puis compare forêt seule et cascade sur le test.
+    Retourne (prefilter, forêt, rapport).
+    """
+    from sklearn.model_selection import train_test_split
+
+    from data_loader import load_columns
+    from preprocessing import FeaturePipeline
+    from scoring import FEATURE_COLUMNS
+    from scoring_service import load_scoring_resources
+    from velocity_features import VELOCITY_FEATURES, add_velocity_features
+
+    model, scaler, threshold = load_scoring_resources(bundle_path)
+    forest = model if isinstance(model, FlatForest) else FlatForest.from_sklearn(model)
+    feature_names = list(forest.feature_names_in_) if forest.feature_names_in_ is not None else FEATURE_COLUMNS
+    pipeline = FeaturePipeline.from_scaler(scaler, feature_names)
+
+    df = load_columns(csv_path=csv_path)
+    if any(c in VELOCITY_FEATURES for c in feature_names):
+        df = add_velocity_features(df)
+    X = pipeline.from_frame(df)
+    y = df['Class'].to_numpy()
+
+    # Mêmes indices que le split du notebook (le découpage ne dépend que de y et du nombre de lignes)
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=test_size, stratify=y,
+                                           random_state=random_state)
+    fit_idx, calib_idx = train_test_split(train_idx, test_size=calibration_size, stratify=y[train_idx],
+                                          random_state=random_state)
+
+    prefilter = LinearPrefilter.fit(X[fit_idx], y[fit_idx], feature_names, columns)
+    # À préserver : les vraies fraudes et tout ce que la forêt signalerait
+    calib_proba = forest.predict_proba(X[calib_idx])[:, 1]
+    prefilter.calibrate(X[calib_idx], (y[calib_idx] == 1) | (calib_proba >= threshold), target_recall)
+
+    cascade = CascadeModel(prefilter, forest)
+    X_test, y_test = X[test_idx], y[test_idx]
+    forest_proba = forest.predict_proba(X_test)[:, 1]
+    cascade_proba = cascade.predict_proba(X_test)[:, 1]
+    forest_s = _best_time(lambda: forest.predict_proba(X_test))
+    cascade_s = _best_time(lambda: cascade.predict_proba(X_test))
+
+    forest_metrics = _detection(y_test, forest_proba, threshold)
+    cascade_metrics = _detection(y_test, cascade_proba, threshold)
+    forest_flags = forest_proba >= threshold
+    report = {
+        'threshold': float(threshold),
+        'target_recall': target_recall,
+        'stage1_columns': list(columns),
+        'stage1_cut': prefilter.cut,
+        'test_rows': int(len(test_idx)),
+        'test_frauds': int((y_test == 1).sum()),
+        'forward_rate': cascade.forward_rate,
+        'forest': forest_metrics,
+        'cascade': cascade_metrics,
+        'recall_loss': forest_metrics['recall'] - cascade_metrics['recall'],
+        # Alertes de la forêt perdues par le filtrage de l'étage 1
+        'lost_forest_alerts': int((forest_flags & ~(cascade_proba >= threshold)).sum()),
+        'forest_rows_per_s': len(test_idx) / forest_s,
+        'cascade_rows_per_s': len(test_idx) / cascade_s,
+        'throughput_gain': forest_s / cascade_s
+    }
+    return prefilter, forest, report
+
+
+def print_report(report):
+    print(f"Étage 1 ({', '.join(report['stage1_columns'])}) : marge >= {report['stage1_cut']:.4f}")
+    print(f"Transactions envoyées à la forêt : {report['forward_rate']:.2%} "
+          f"({report['test_rows']:,} transactions de test, {report['test_frauds']} fraudes)")
+    for name in ['forest', 'cascade']:
+        m = report[name]
+        print(f"  {name:<8} recall {m['recall']:.4f} | precision {m['precision']:.4f} | {m['flagged']} signalées "
+              f"| {report[f'{name}_rows_per_s']:,.0f} transactions/s")
+    print(f"Perte de recall : {report['recall_loss']:.4f} ({report['lost_forest_alerts']} alertes de la forêt perdues)")
+    print(f"Gain de débit : x{report['throughput_gain']:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibre le pré-filtre de la cascade et compare avec la forêt seule")
+    parser.add_argument('--csv', default='creditcard.csv')
+    parser.add_argument('--bundle', default='modele_fraude_bundle')
+    parser.add_argument('--target-recall', type=float, default=DEFAULT_TARGET_RECALL)
+    parser.add_argument('--output', default=None, help="Fichier de l'étage 1 (par défaut : dans le bundle)")
+    parser.add_argument('--dry-run', action='store_true', help="Rapport seulement, sans écrire l'étage 1")
+    args = parser.parse_args(argv)
+
+    prefilter, forest, report = build_cascade(args.csv, args.bundle, args.target_recall)
+    print_report(report)
+    if args.dry_run:
+        return
+    output = args.output or (args.bundle if os.path.isdir(args.bundle) else CASCADE_FILE)
+    path = save_cascade(prefilter, forest, output, target_recall=args.target_recall, report=report)
+    report_path = os.path.join(os.path.dirname(path), REPORT_FILE)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Étage 1 sauvegardé : {path} (rapport : {report_path})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# --- CACHE DES GRAPHIQUES ---
+# Les graphiques sont rendus une seule fois par (version du dataset, sélection de colonnes, style) :
+# images PNG pour les heatmaps matplotlib/seaborn, specs Vega-Lite pour les courbes et barres.
+# Cache LRU en mémoire (partagé par toutes les sessions Streamlit du processus) + fichiers sur disque
+# (réutilisés après un redémarrage). Les figures matplotlib sont fermées dès qu'elles sont rendues.
+DEFAULT_CHART_CACHE_DIR = 'chart_cache'
+
+
+def chart_key(*parts):
+    """ Clé stable à partir de la version des données, des colonnes et des options de style """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def frame_version(df):
+    """ Empreinte du contenu d'un DataFrame (ex. échantillon chargé) : change dès que les données changent """
+    import pandas as pd
+    if df is None:
+        return None
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()[:16]
+
+
+class ChartCache:
+    """ Cache LRU borné (mémoire) adossé à un dossier de fichiers (disque) """
+
+    def __init__(self, cache_dir=DEFAULT_CHART_CACHE_DIR, max_items=64, max_files=512):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_files = max_files
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key, kind):
+        return os.path.join(self.cache_dir, f"{key}.{kind}")
+
+    def get(self, key, build, kind='png'):
+        """
+        Retourne le graphique en cache ou l'obtient via `build()` :
+        kind='png' -> octets de l'image, kind='json' -> spec Vega-Lite (dict).
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+
+        path = self._path(key, kind) if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                raw = f.read()
+            value = raw if kind == 'png' else json.loads(raw)
+            self.hits += 1
+        else:
+            value = build()
+            self.misses += 1
+            if path:
+                self._write(path, value if kind == 'png' else json.dumps(value).encode('utf-8'))
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def _write(self, path, raw):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+
+        # Le dossier reste borné : on supprime les fichiers les plus anciens
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if not f.endswith('.tmp')]
+        if len(files) > self.max_files:
+            files.sort(key=os.path.getmtime)
+            for old in files[:len(files) - self.max_files]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+
+# --- RENDU ---
+
+def render_heatmap(corr, figsize=(10, 6), cmap='coolwarm', annot=True, dpi=100):
+    """ Heatmap seaborn -> PNG ; la figure est libérée immédiatement (pas d'accumulation en mémoire) """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=figsize)
+    try:
+        sns.heatmap(corr, annot=annot, cmap=cmap, ax=ax)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def series_chart_spec(series, mark='line', x_title=None, y_title=None):
+    """ Série pandas -> spec Vega-Lite (données incluses), pour st.vega_lite_chart """
+    index_name = series.index.name or 'index'
+    value_name = series.name or 'value'
+    values = [
+        {index_name: str(i) if mark == 'bar' else i, value_name: float(v)}
+        for i, v in zip(series.index.tolist(), series.tolist())
+    ]
+    x_type = 'nominal' if mark == 'bar' else 'quantitative'
+    return {
+        'data': {'values': values},
+        'mark': {'type': mark, 'tooltip': True},
+        'encoding': {
+            'x': {'field': index_name, 'type': x_type, 'title': x_title or index_name,
+                  **({'sort': None} if mark == 'bar' else {})},
+            'y': {'field': value_name, 'type': 'quantitative', 'title': y_title or value_name}
+        }
+    }
@@ -0,0 +1,461 @@
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from fast_forest import FlatForest
+
+# --- COMPRESSION DE LA FORÊT ---
+# Après l'entraînement, trois réductions successives de la forêt exportée :
+#   1. sélection gloutonne des arbres sur un jeu de validation : on ajoute un à un les arbres
+#      qui font le plus monter l'AUC, jusqu'à retrouver celle de la forêt complète (à une tolérance près) ;
+#   2. seuils en float32 arrondis vers le bas : X est lu en float32, les décisions sont donc identiques ;
+#   3. probabilités des nœuds en float32 ou quantifiées sur 16 / 8 bits (sommes entières exactes).
+# Les tableaux left/right (redondants avec `children`) ne sont pas conservés.
+# Le résultat est un bundle au format habituel, utilisable partout à la place de l'original.
+DEFAULT_AUC_TOLERANCE = 0.001
+DEFAULT_MAX_RECALL_LOSS = 0.0
+# Une petite forêt donne des probabilités plus grossières : on borne aussi la hausse des fausses alertes
+DEFAULT_MAX_PRECISION_LOSS = 0.01
+# Plancher : sur un petit jeu de validation, l'arrêt peut survenir après un seul arbre (sur-apprentissage)
+DEFAULT_MIN_TREES = 10
+# Encodage des probabilités -> nombre de niveaux (None : flottant)
+VALUE_ENCODINGS = {'float32': None, 'uint16': 65535, 'uint8': 255}
+DEFAULT_VALUE_ENCODING = 'uint16'
+REPORT_FILE = 'compression_report.json'
+
+
+def round_down_float32(threshold):
+    """
+    Plus grand float32 <= seuil : pour tout x float32, x > seuil <=> x > seuil arrondi.
+    Un arrondi au plus proche pourrait envoyer à droite des valeurs qui allaient à gauche.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _max_depth(children, roots):
+    """ Profondeur maximale, niveau par niveau (une feuille boucle sur elle-même) """
+    pairs = children.reshape(-1, 2)
+    frontier, depth = np.asarray(roots), 0
+    while True:
+        internal = frontier[pairs[frontier, 0] != frontier]
+        if not len(internal):
+            return depth
+        frontier = pairs[internal].ravel()
+        depth += 1
+
+
+def subset_forest(forest, trees):
+    """ Forêt réduite aux arbres `trees` (nœuds recopiés de façon contiguë, indices des fils renumérotés) """
+    n_nodes = len(forest.feature)
+    starts = np.asarray(forest.roots, dtype=np.int64)
+    ends = np.r_[starts[1:], n_nodes]
+    nodes = np.concatenate([np.arange(starts[t], ends[t]) for t in trees])
+    new_index = np.full(n_nodes, -1, dtype=np.int64)
+    new_index[nodes] = np.arange(len(nodes))
+
+    children = new_index[np.asarray(forest.children).reshape(-1, 2)[nodes]].ravel().astype(np.int32)
+    roots = new_index[starts[trees]].astype(np.int32)
+    return FlatForest(
+        feature=np.ascontiguousarray(forest.feature[nodes]),
+        threshold=np.ascontiguousarray(forest.threshold[nodes]),
+        left=None, right=None,
+        value=np.ascontiguousarray(forest.value[nodes]),
+        roots=roots,
+        max_depth=_max_depth(children, roots),
+        classes=forest.classes_,
+        feature_names=forest.feature_names_in_,
+        children=children,
+        value_scale=forest.value_scale
+    )
+
+
+def quantize_forest(forest, value_encoding=DEFAULT_VALUE_ENCODING):
+    """ Seuils float32 (sans perte), features sur 8/16 bits, probabilités en float32 ou en niveaux entiers """
+    if value_encoding not in VALUE_ENCODINGS:
+        raise ValueError(f"Encodage inconnu : {value_encoding} (attendu : {list(VALUE_ENCODINGS)})")
+    n_features = int(np.max(forest.feature)) + 1
+    feature_dtype = np.uint8 if n_features <= 256 else np.uint16 if n_features <= 65536 else np.int32
+
+    proba = forest.node_proba()
+    levels = VALUE_ENCODINGS[value_encoding]
+    if levels is None:
+        value, value_scale = proba.astype(np.float32), None
+    else:
+        value = np.rint(proba * levels)
+        # Les probabilités de chaque nœud somment exactement à 1
+        value[:, 0] = levels - value[:, 1:].sum(axis=1)
+        value, value_scale = value.astype(value_encoding), 1.0 / levels
+
+    return FlatForest(
+        feature=np.ascontiguousarray(forest.feature, dtype=feature_dtype),
+        threshold=round_down_float32(forest.threshold),
+        left=None, right=None,
+        value=np.ascontiguousarray(value),
+        roots=np.asarray(forest.roots, dtype=np.int32),
+        max_depth=forest.max_depth,
+        classes=forest.classes_,
+        feature_names=forest.feature_names_in_,
+        children=np.ascontiguousarray(forest.children, dtype=np.int32),
+        value_scale=value_scale
+    )
+
+
+# --- SÉLECTION DES ARBRES ---
+
+def tree_probas(forest, X, positive_class=1):
+    """ Probabilité de fraude donnée par chaque arbre : tableau (n_trees, n_samples) """
+    class_idx = int(np.flatnonzero(np.asarray(forest.classes_) == positive_class)[0])
+    leaves = forest.apply(X)
+    return np.ascontiguousarray(forest.node_proba()[leaves.T, class_idx])
+
+
+def _auc(positive, score):
+    """ AUC de Mann-Whitney (rangs moyens pour les ex aequo) : un seul tri """
+    order = np.argsort(score, kind='mergesort')
+    sorted_score = score[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_score)) + 1]
+    ends = np.r_[starts[1:], len(score)]
+    ranks = np.repeat((starts + ends + 1) / 2, ends - starts)
+    n_pos = int(positive.sum())
+    n_neg = len(score) - n_pos
+    return float((ranks[positive[order]].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+def _recall(positive, proba, threshold):
+    return float((proba[positive] >= threshold).mean())
+
+
+def _precision(positive, proba, threshold):
+    flagged = proba >= threshold
+    return float(positive[flagged].mean()) if flagged.any() else 0.0
+
+
+def select_trees(per_tree, y, threshold, auc_tolerance=DEFAULT_AUC_TOLERANCE,
+                 max_recall_loss=DEFAULT_MAX_RECALL_LOSS, max_precision_loss=DEFAULT_MAX_PRECISION_LOSS,
+                 min_trees=DEFAULT_MIN_TREES):
+    """
+    Sélection gloutonne (ensemble selection) : à chaque étape, l'arbre qui maximise l'AUC de la moyenne.
+    Arrêt dès que l'AUC de validation de la forêt complète est retrouvée à `auc_tolerance` près,
+    sans perdre plus de `max_recall_loss` de recall ni `max_precision_loss` de precision au seuil,
+    et jamais avant `min_trees` arbres. Retourne (indices gardés dans l'ordre d'origine, historique par étape).
+    """
+    positive = np.asarray(y) == 1
+    if not positive.any() or positive.all():
+        raise ValueError("Le jeu de validation doit contenir des fraudes ET des transactions normales")
+    n_trees = per_tree.shape[0]
+    min_trees = min(min_trees, n_trees)
+    full_proba = per_tree.mean(axis=0)
+    target_auc = _auc(positive, full_proba) - auc_tolerance
+    target_recall = _recall(positive, full_proba, threshold) - max_recall_loss
+    target_precision = _precision(positive, full_proba, threshold) - max_precision_loss
+
+    selected, remaining = [], list(range(n_trees))
+    total = np.zeros(per_tree.shape[1])
+    history = []
+    while remaining:
+        # La moyenne a le même classement que la somme : l'AUC se calcule sur la somme
+        scores = [_auc(positive, total + per_tree[t]) for t in remaining]
+        best = int(np.argmax(scores))
+        tree = remaining.pop(best)
+        selected.append(tree)
+        total += per_tree[tree]
+        proba = total / len(selected)
+        recall, precision = _recall(positive, proba, threshold), _precision(positive, proba, threshold)
+        history.append({'n_trees': len(selected), 'tree': tree, 'auc': scores[best],
+                        'recall': recall, 'precision': precision})
+        if (len(selected) >= min_trees and scores[best] >= target_auc and recall >= target_recall
+                and precision >= target_precision):
+            break
+    return np.sort(selected), history
+
+
+def pruned_estimator(model, trees):
+    """ Même RandomForestClassifier réduit aux arbres gardés (pour le réentraînement incrémental) """
+    pruned = copy.copy(model)
+    pruned.estimators_ = [model.estimators_[t] for t in trees]
+    pruned.set_params(n_estimators=len(pruned.estimators_))
+    return pruned
+
+
+def compress_forest(forest, X_val, y_val, threshold, auc_tolerance=DEFAULT_AUC_TOLERANCE,
+                    max_recall_loss=DEFAULT_MAX_RECALL_LOSS, max_precision_loss=DEFAULT_MAX_PRECISION_LOSS,
+                    value_encoding=DEFAULT_VALUE_ENCODING, min_trees=DEFAULT_MIN_TREES):
+    """ Sélection des arbres sur (X_val, y_val) puis quantification. Retourne (forêt compressée, arbres gardés, historique) """
+    trees, history = select_trees(tree_probas(forest, X_val), y_val, threshold, auc_tolerance,
+                                  max_recall_loss, max_precision_loss, min_trees)
+    return quantize_forest(subset_forest(forest, trees), value_encoding), trees, history
+
+
+# --- RAPPORT HORS LIGNE ---
+
+def load_source(bundle_path='modele_fraude_bundle', model_path='modele_fraude.joblib', scaler_path='scaler.joblib'):
+    """ Modèle à compresser : bundle si présent, sinon modele_fraude.joblib + scaler.joblib (ancien format) """
+    import joblib
+
+    from model_bundle import ESTIMATOR_FILE, FOREST_FILE, load_bundle
+    from scoring import FEATURE_COLUMNS, SCALED_COLUMNS, load_threshold
+
+    if bundle_path and os.path.isdir(bundle_path):
+        bundle = load_bundle(bundle_path)
+        return {
+            'forest': bundle.forest, 'estimator': bundle.estimator, 'scaler': bundle.scaler,
+            'scaled_columns': bundle.scaler.columns, 'feature_names': bundle.feature_names,
+            'threshold': bundle.threshold, 'metrics': bundle.metrics,
+            'threshold_details': bundle.manifest.get('threshold_details'), 'version': bundle.version,
+            'bundle_path': bundle_path,
+            'files': [os.path.join(bundle_path, FOREST_FILE), os.path.join(bundle_path, ESTIMATOR_FILE)]
+        }
+    model = joblib.load(model_path)
+    feature_names = getattr(model, 'feature_names_in_', None)
+    return {
+        'forest': FlatForest.from_sklearn(model), 'estimator': model, 'scaler': joblib.load(scaler_path),
+        'scaled_columns': SCALED_COLUMNS,
+        'feature_names': list(feature_names) if feature_names is not None else FEATURE_COLUMNS,
+        'threshold': load_threshold(model_path), 'metrics': {}, 'threshold_details': None,
+        'version': None, 'bundle_path': None, 'model_path': model_path, 'files': [model_path]
+    }
+
+
+def _best_time(func, repeats=3):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _single_row_latency(forest, X, n_iter=500):
+    timings = []
+    for i in range(n_iter):
+        row = X[i % len(X)][np.newaxis, :]
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': float(np.percentile(timings, 50)), 'p99_ms': float(np.percentile(timings, 99))}
+
+
+def _forest_stats(forest, y_true, proba, threshold, X):
+    from sklearn.metrics import roc_auc_score
+
+    flagged = proba >= threshold
+    tp = int((flagged & (y_true == 1)).sum())
+    return {
+        'n_trees': forest.n_trees,
+        'n_nodes': int(len(forest.feature)),
+        'max_depth': forest.max_depth,
+        'memory_bytes': int(sum(a.nbytes for a in forest.to_arrays().values() if isinstance(a, np.ndarray))),
+        'auc': float(roc_auc_score(y_true, proba)),
+        'recall': tp / max(int((y_true == 1).sum()), 1),
+        'precision': tp / max(int(flagged.sum()), 1),
+        'flagged': int(flagged.sum()),
+        'single_row': _single_row_latency(forest, X),
+        'rows_per_s': len(X) / _best_time(lambda: forest.predict_proba(X))
+    }
+
+
+def build_compression(csv_path='creditcard.csv', bundle_path='modele_fraude_bundle', model_path='modele_fraude.joblib',
+                      scaler_path='scaler.joblib', auc_tolerance=DEFAULT_AUC_TOLERANCE,
+                      max_recall_loss=DEFAULT_MAX_RECALL_LOSS, max_precision_loss=DEFAULT_MAX_PRECISION_LOSS,
+                      value_encoding=DEFAULT_VALUE_ENCODING, min_trees=DEFAULT_MIN_TREES, test_size=0.3,
+                      random_state=42):
+    """
+    Compresse la forêt en sélectionnant les arbres sur une moitié du test du notebook
+    (test_size=0.3, stratifié, random_state=42 ; les lignes d'entraînement ont été vues par les arbres)
+    et compare forêt d'origine et forêt compressée sur l'autre moitié.
+    Retourne (source, forêt compressée, arbres gardés, rapport).
+    """
+    from sklearn.model_selection import train_test_split
+
+    from data_loader import load_columns
+    from preprocessing import FeaturePipeline
+    from velocity_features import VELOCITY_FEATURES, add_velocity_features
+
+    source = load_source(bundle_path, model_path, scaler_path)
+    forest, threshold = source['forest'], source['threshold']
+    pipeline = FeaturePipeline.from_scaler(source['scaler'], source['feature_names'])
+
+    df = load_columns(csv_path=csv_path)
+    if any(c in VELOCITY_FEATURES for c in source['feature_names']):
+        df = add_velocity_features(df)
+    X = pipeline.from_frame(df)
+    y = df['Class'].to_numpy()
+
+    # Mêmes indices que le split du notebook, puis test coupé en deux : sélection / rapport
+    _, test_idx = train_test_split(np.arange(len(y)), test_size=test_size, stratify=y, random_state=random_state)
+    select_idx, report_idx = train_test_split(test_idx, test_size=0.5, stratify=y[test_idx],
+                                              random_state=random_state)
+
+    compressed, trees, history = compress_forest(forest, X[select_idx], y[select_idx], threshold,
+                                                 auc_tolerance, max_recall_loss, max_precision_loss, value_encoding,
+                                                 min_trees)
+
+    X_report, y_report = X[report_idx], y[report_idx]
+    original_proba = forest.predict_proba(X_report)[:, 1]
+    compressed_proba = compressed.predict_proba(X_report)[:, 1]
+    original = _forest_stats(forest, y_report, original_proba, threshold, X_report)
+    result = _forest_stats(compressed, y_report, compressed_proba, threshold, X_report)
+    report = {
+        'threshold': float(threshold),
+        'value_encoding': value_encoding,
+        'auc_tolerance': auc_tolerance,
+        'max_recall_loss': max_recall_loss,
+        'max_precision_loss': max_precision_loss,
+        'min_trees': min_trees,
+        'selection_rows': int(len(select_idx)),
+        'report_rows': int(len(report_idx)),
+        'report_frauds': int((y_report == 1).sum()),
+        'kept_trees': [int(t) for t in trees],
+        'selection_history': history,
+        'original': original,
+        'compressed': result,
+        'auc_delta': result['auc'] - original['auc'],
+        'recall_delta': result['recall'] - original['recall'],
+        'max_proba_diff': float(np.abs(compressed_proba - original_proba).max()),
+        # Transactions dont la décision au seuil change
+        'changed_decisions': int(((original_proba >= threshold) != (compressed_proba >= threshold)).sum()),
+        'memory_ratio': original['memory_bytes'] / result['memory_bytes'],
+        'single_row_speedup': original['single_row']['p50_ms'] / result['single_row']['p50_ms'],
+        'throughput_gain': result['rows_per_s'] / original['rows_per_s']
+    }
+    return source, compressed, trees, report
+
+
+def save_compressed(source, compressed, trees, path, report):
+    """ Bundle compressé : forêt quantifiée + estimateur sklearn réduit aux mêmes arbres """
+    from model_bundle import save_bundle
+
+    compression = {
+        'source_version': source['version'] or source.get('model_path'),
+        'n_trees_before': int(source['forest'].n_trees),
+        'kept_trees': [int(t) for t in trees],
+        'value_encoding': report['value_encoding'],
+        'threshold_dtype': 'float32',
+        'auc_delta': report['auc_delta'],
+        'recall_delta': report['recall_delta']
+    }
+    return save_bundle(pruned_estimator(source['estimator'], trees), source['scaler'], source['feature_names'],
+                       threshold=source['threshold'], metrics=source['metrics'], path=path,
+                       scaled_columns=source['scaled_columns'], threshold_details=source['threshold_details'],
+                       forest=compressed, compression=compression)
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def measure_artifacts(source, path, report):
+    """ Taille sur disque et temps de chargement (forêt, estimateur) : source vs bundle compressé """
+    import joblib
+
+    from model_bundle import ESTIMATOR_FILE, FOREST_FILE, load_bundle
+
+    if source['bundle_path']:
+        forest_file, estimator_file = source['files']
+        original_forest_s = _best_time(lambda: load_bundle(source['bundle_path'], mmap_mode=None))
+    else:
+        forest_file, estimator_file = None, source['model_path']
+        original_forest_s = _best_time(lambda: FlatForest.from_sklearn(joblib.load(estimator_file)))
+    report['original'].update({
+        'forest_file_bytes': _file_size(forest_file) if forest_file else 0,
+        'estimator_file_bytes': _file_size(estimator_file),
+        'forest_load_s': original_forest_s,
+        'estimator_load_s': _best_time(lambda: joblib.load(estimator_file))
+    })
+    report['compressed'].update({
+        'forest_file_bytes': _file_size(os.path.join(path, FOREST_FILE)),
+        'estimator_file_bytes': _file_size(os.path.join(path, ESTIMATOR_FILE)),
+        'forest_load_s': _best_time(lambda: load_bundle(path, mmap_mode=None)),
+        'estimator_load_s': _best_time(lambda: joblib.load(os.path.join(path, ESTIMATOR_FILE)))
+    })
+    return report
+
+
+def _bytes(n):
+    if not n:
+        return '-'
+    return f"{n / 1024 ** 2:,.2f} Mo" if n >= 1024 ** 2 else f"{n / 1024:,.1f} Ko"
+
+
+def print_report(report):
+    original, compressed = report['original'], report['compressed']
+    print(f"Arbres gardés : {compressed['n_trees']} / {original['n_trees']} "
+          f"({compressed['n_nodes']:,} nœuds sur {original['n_nodes']:,}, profondeur {compressed['max_depth']})")
+    print(f"Probabilités : {report['value_encoding']} | seuils : float32 (arrondis vers le bas)")
+    print(f"{'':<22}{'origine':>14}{'compressée':>14}")
+    rows = [('Mémoire', _bytes(original['memory_bytes']), _bytes(compressed['memory_bytes']))]
+    if 'forest_file_bytes' in compressed:
+        rows += [
+            ('forest.joblib', _bytes(original['forest_file_bytes']), _bytes(compressed['forest_file_bytes'])),
+            ('Estimateur sklearn', _bytes(original['estimator_file_bytes']), _bytes(compressed['estimator_file_bytes'])),
+            ('Chargement forêt', f"{original['forest_load_s'] * 1000:.1f} ms", f"{compressed['forest_load_s'] * 1000:.1f} ms"),
+            ('Chargement sklearn', f"{original['estimator_load_s'] * 1000:.1f} ms",
+             f"{compressed['estimator_load_s'] * 1000:.1f} ms")
+        ]
+    rows += [
+        ('Latence unitaire p50', f"{original['single_row']['p50_ms']:.3f} ms", f"{compressed['single_row']['p50_ms']:.3f} ms"),
+        ('Latence unitaire p99', f"{original['single_row']['p99_ms']:.3f} ms", f"{compressed['single_row']['p99_ms']:.3f} ms"),
+        ('Débit', f"{original['rows_per_s']:,.0f}/s", f"{compressed['rows_per_s']:,.0f}/s"),
+        ('AUC', f"{original['auc']:.4f}", f"{compressed['auc']:.4f}"),
+        ('Recall', f"{original['recall']:.4f}", f"{compressed['recall']:.4f}"),
+        ('Precision', f"{original['precision']:.4f}", f"{compressed['precision']:.4f}")
+    ]
+    for name, before, after in rows:
+        print(f"{name:<22}{before:>14}{after:>14}")
+    print(f"Écarts (rapport : {report['report_rows']:,} transactions, {report['report_frauds']} fraudes) : "
+          f"AUC {report['auc_delta']:+.4f} | recall {report['recall_delta']:+.4f} | "
+          f"{report['changed_decisions']} décisions changées | proba max {report['max_proba_diff']:.2e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compresse la forêt exportée et compare avec le modèle d'origine")
+    parser.add_argument('--csv', default='creditcard.csv')
+    parser.add_argument('--bundle', default='modele_fraude_bundle')
+    parser.add_argument('--model', default='modele_fraude.joblib', help="Ancien format, si le bundle est absent")
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--auc-tolerance', type=float, default=DEFAULT_AUC_TOLERANCE)
+    parser.add_argument('--max-recall-loss', type=float, default=DEFAULT_MAX_RECALL_LOSS)
+    parser.add_argument('--max-precision-loss', type=float, default=DEFAULT_MAX_PRECISION_LOSS)
+    parser.add_argument('--min-trees', type=int, default=DEFAULT_MIN_TREES)
+    parser.add_argument('--values', choices=list(VALUE_ENCODINGS), default=DEFAULT_VALUE_ENCODING)
+    parser.add_argument('--output', default=None, help="Bundle compressé (par défaut : <bundle>_compressed)")
+    parser.add_argument('--dry-run', action='store_true', help="Rapport seulement, sans garder le bundle compressé")
+    args = parser.parse_args(argv)
+
+    source, compressed, trees, report = build_compression(
+        args.csv, args.bundle, args.model, args.scaler, args.auc_tolerance, args.max_recall_loss,
+        args.max_precision_loss, args.values, args.min_trees
+    )
+    # La sélection a été faite sur l'autre moitié : c'est la moitié du rapport qui décide
+    rejected = report['recall_delta'] < -args.max_recall_loss
+    if args.dry_run or rejected:
+        # Bundle écrit dans un dossier temporaire : seulement pour mesurer taille et chargement
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = save_compressed(source, compressed, trees, os.path.join(tmp_dir, 'bundle'), report)
+            measure_artifacts(source, path, report)
+        print_report(report)
+        if rejected:
+            raise SystemExit(f"Bundle compressé non écrit : perte de recall {-report['recall_delta']:.4f} sur la moitié "
+                             f"du rapport (maximum {args.max_recall_loss}). Augmentez --min-trees ou réduisez --auc-tolerance.")
+        return
+
+    output = args.output or f"{(source['bundle_path'] or 'modele_fraude_bundle').rstrip('/')}_compressed"
+    path = save_compressed(source, compressed, trees, output, report)
+    measure_artifacts(source, path, report)
+    print_report(report)
+    with open(os.path.join(path, REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Bundle compressé : {path} (rapport : {os.path.join(path, REPORT_FILE)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- TYPES EXPLICITES DU DATASET ---
+# float32 pour Time, V1-V28 et Amount, int8 pour Class : moitié moins de mémoire que float64
+V_FEATURES = [f'V{i}' for i in range(1, 29)]
+CSV_DTYPES = {
+    'Time': np.float32,
+    **{v: np.float32 for v in V_FEATURES},
+    'Amount': np.float32,
+    'Class': np.int8
+}
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+# --- CACHE COLONNAIRE (FEATHER / ARROW IPC) ---
+# Le CSV est converti une seule fois en Feather non compressé, puis relu par memory map :
+# seules les colonnes demandées sont touchées sur le disque.
+
+def _cache_paths(csv_path):
+    base, _ = os.path.splitext(csv_path)
+    return base + '.feather', base + '.feather.json'
+
+
+def _file_hash(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_cache_valid(csv_path, cache_path, meta_path):
+    """ Le cache est valide si mtime/taille du CSV n'ont pas bougé (ou, à défaut, si le hash est identique) """
+    if not (os.path.exists(cache_path) and os.path.exists(meta_path)):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stat = os.stat(csv_path)
+    if meta.get('size') == stat.st_size and meta.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    # mtime modifié (copie, touch...) : on ne reconstruit que si le contenu a changé
+    if meta.get('size') == stat.st_size and meta.get('sha256') == _file_hash(csv_path):
+        meta['mtime_ns'] = stat.st_mtime_ns
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=4)
+        return True
+    return False
+
+
+def write_feather_chunks(chunks, path):
+    """ Écrit une suite de DataFrames dans un seul fichier Feather, sans tout garder en mémoire """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    tmp_path = path + '.tmp'
+    writer = None
+    n_rows = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # Pas de compression : indispensable pour relire en memory map sans copie
+                writer = ipc.new_file(tmp_path, table.schema)
+            writer.write_table(table)
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f"Aucune donnée à écrire dans {path}")
+    os.replace(tmp_path, path)
+    return n_rows
+
+
+def ensure_columnar_cache(csv_path='creditcard.csv', chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Convertit le CSV en Feather typé (une seule fois) et retourne le chemin du cache.
+    Le cache est reconstruit quand le mtime/hash du CSV change.
+    """
+    cache_path, meta_path = _cache_paths(csv_path)
+    if _is_cache_valid(csv_path, cache_path, meta_path):
+        return cache_path
+
+    n_rows = write_feather_chunks(pd.read_csv(csv_path, chunksize=chunksize, dtype=CSV_DTYPES), cache_path)
+
+    stat = os.stat(csv_path)
+    with open(meta_path, 'w') as f:
+        json.dump({
+            'source': os.path.basename(csv_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': _file_hash(csv_path),
+            'rows': n_rows
+        }, f, indent=4)
+    return cache_path
+
+
+def load_columns(columns=None, csv_path='creditcard.csv'):
+    """
+    Charge le dataset (ou un sous-ensemble de colonnes) depuis le cache colonnaire en memory map.
+    Sans pyarrow, on retombe sur une lecture CSV typée des seules colonnes demandées.
+    """
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return pd.read_csv(csv_path, usecols=columns, dtype=CSV_DTYPES)
+
+    cache_path = ensure_columnar_cache(csv_path)
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    # split_blocks évite de recopier les colonnes dans un bloc 2D pandas
+    return table.to_pandas(split_blocks=True)
+
+
+def columnar_cache_version(csv_path='creditcard.csv'):
+    """ Identifiant de version du dataset (hash du CSV), utilisable comme clé de cache """
+    _, meta_path = _cache_paths(csv_path)
+    ensure_columnar_cache(csv_path)
+    with open(meta_path) as f:
+        return json.load(f)['sha256']
+
+
+# --- STORE COLONNAIRE INCRÉMENTAL ---
+# Dossier de partitions Feather (une par lot de transactions labellisées),
+# alimenté par le réentraînement et le rééchantillonnage hors mémoire.
+DEFAULT_STORE_DIR = 'transactions_store'
+
+
+def append_to_store(df, store_dir=DEFAULT_STORE_DIR, name=None):
+    """ Ajoute un lot au store sous forme d'une nouvelle partition Feather (écriture atomique) """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    from datetime import datetime
+
+    os.makedirs(store_dir, exist_ok=True)
+    name = name or datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    path = os.path.join(store_dir, f"part-{name}.feather")
+    typed = df.astype({c: t for c, t in CSV_DTYPES.items() if c in df.columns})
+    table = pa.Table.from_pandas(typed, preserve_index=False)
+    feather.write_feather(table, path + '.tmp', compression='uncompressed')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def list_store_parts(store_dir=DEFAULT_STORE_DIR):
+    """ Partitions du store, de la plus ancienne à la plus récente """
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(
+        os.path.join(store_dir, f) for f in os.listdir(store_dir)
+        if f.startswith('part-') and f.endswith('.feather')
+    )
+
+
+def load_store(store_dir=DEFAULT_STORE_DIR, columns=None, last_parts=None):
+    """ Relit le store (ou ses `last_parts` partitions les plus récentes) en memory map """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    parts = list_store_parts(store_dir)
+    if last_parts is not None:
+        parts = parts[-last_parts:] if last_parts > 0 else []
+    if not parts:
+        return pd.DataFrame(columns=columns or list(CSV_DTYPES))
+    tables = [feather.read_table(p, columns=columns, memory_map=True) for p in parts]
+    return pa.concat_tables(tables).to_pandas(split_blocks=True)
+
+
+def _kpis(n_transactions, total_frauds, fraud_amount_sum):
+    return {
+        'n_transactions': n_transactions,
+        'total_frauds': total_frauds,
+        'fraud_rate': total_frauds / n_transactions * 100 if n_transactions else 0.0,
+        'avg_fraud_amount': fraud_amount_sum / total_frauds if total_frauds else 0.0
+    }
+
+
+def load_sample_and_kpis_columnar(path='creditcard.csv', sample_size=10000, random_state=42):
+    """
+    Variante sur le cache colonnaire : les KPIs ne lisent que Class et Amount,
+    l'échantillon est tiré directement par indices.
+    """
+    import pyarrow.feather as feather
+
+    rng = np.random.default_rng(random_state)
+    table = feather.read_table(ensure_columnar_cache(path), memory_map=True)
+
+    classes = table.column('Class').to_numpy()
+    amounts = table.column('Amount').to_numpy()
+    fraud_mask = classes == 1
+    kpis = _kpis(len(classes), int(fraud_mask.sum()),
+                 float(amounts[fraud_mask].sum(dtype=np.float64)))
+
+    n = table.num_rows
+    if n > sample_size:
+        rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = table.take(rows).to_pandas()
+        sample.index = rows
+    else:
+        sample = table.to_pandas()
+    return sample, kpis
+
+
+def load_sample_and_kpis(path='creditcard.csv', sample_size=10000, chunksize=DEFAULT_CHUNKSIZE,
+                         random_state=42):
+    """
+    Lit le CSV par blocs en un seul passage :
+    - échantillon uniforme de `sample_size` lignes (reservoir sampling)
+    - KPIs exacts sur tout le fichier (taux de fraude, total fraudes, montant moyen des fraudes)
+    """
+    rng = np.random.default_rng(random_state)
+
+    reservoir = None
+    reservoir_keys = np.empty(0)
+    n_transactions = 0
+    total_frauds = 0
+    fraud_amount_sum = 0.0
+
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=CSV_DTYPES):
+        # KPIs exacts (accumulés en float64 / int64)
+        fraud_mask = chunk['Class'].to_numpy() == 1
+        n_transactions += len(chunk)
+        total_frauds += int(fraud_mask.sum())
+        fraud_amount_sum += float(chunk['Amount'].to_numpy()[fraud_mask].sum(dtype=np.float64))
+
+        # Reservoir sampling : chaque ligne reçoit une clé aléatoire,
+        # on garde les `sample_size` plus petites clés vues jusqu'ici
+        keys = rng.random(len(chunk))
+        if reservoir is None:
+            candidates, candidate_keys = chunk, keys
+        else:
+            candidates = pd.concat([reservoir, chunk])
+            candidate_keys = np.concatenate([reservoir_keys, keys])
+
+        if len(candidates) > sample_size:
+            keep = np.argpartition(candidate_keys, sample_size - 1)[:sample_size]
+            reservoir, reservoir_keys = candidates.iloc[keep], candidate_keys[keep]
+        else:
+            reservoir, reservoir_keys = candidates, candidate_keys
+
+    if reservoir is None:
+        reservoir = pd.DataFrame(columns=list(CSV_DTYPES)).astype(CSV_DTYPES)
+
+    # On conserve l'ordre d'origine du fichier (aperçu séquentiel)
+    sample = reservoir.sort_index()
+
+    return sample, _kpis(n_transactions, total_frauds, fraud_amount_sum)
+
+
+# --- DONNÉES SYNTHÉTIQUES ---
+# Transactions au schéma de creditcard.csv pour les bancs d'essai et le rejeu sans le vrai fichier.
+# Taille, taux de fraude et durée (s) du vrai dataset :
+N_TRANSACTIONS = 284807
+FRAUD_RATE = 492 / N_TRANSACTIONS
+MAX_TIME = 172792
+
+# Décalage moyen des fraudes sur les features les plus discriminantes du vrai dataset
+FRAUD_SHIFTS = {'V14': -6.0, 'V17': -5.0, 'V12': -5.0, 'V10': -4.0, 'V4': 3.0, 'V11': 3.0}
+
+
+def generate_synthetic(n_rows, fraud_rate=FRAUD_RATE, random_state=42, time_window=(0, MAX_TIME)):
+    """ Transactions synthétiques : mêmes colonnes, mêmes types et même déséquilibre que creditcard.csv """
+    rng = np.random.default_rng(random_state)
+    y = (rng.random(n_rows) < fraud_rate).astype(np.int8)
+    data = {'Time': np.sort(rng.uniform(*time_window, n_rows)).round()}
+    for i in range(1, 29):
+        values = rng.normal(0, 1, n_rows)
+        shift = FRAUD_SHIFTS.get(f'V{i}')
+        if shift is not None:
+            values[y == 1] += shift
+        data[f'V{i}'] = values
+    data['Amount'] = rng.lognormal(3.0, 1.5, n_rows).round(2)
+    data['Class'] = y
+    return pd.DataFrame(data).astype(CSV_DTYPES)
+
+
+def write_synthetic_csv(path, n_rows, chunksize=500_000, random_state=42):
+    """ Écrit le CSV par blocs (mémoire bornée) ; la colonne Time reste croissante """
+    n_chunks = max(1, -(-n_rows // chunksize))
+    seeds = np.random.SeedSequence(random_state).spawn(n_chunks)
+    for i, start in enumerate(range(0, n_rows, chunksize)):
+        size = min(chunksize, n_rows - start)
+        window = (MAX_TIME * start / n_rows, MAX_TIME * (start + size) / n_rows)
+        chunk = generate_synthetic(size, random_state=seeds[i], time_window=window)
+        chunk.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+    return path
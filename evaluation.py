@@ -0,0 +1,315 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+# Métriques calculées à partir des probabilités hors-pli (out-of-fold)
+SCORING_METRICS = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']
+
+
+def _fit_fold_proba(model, X, y, train_idx, test_idx):
+    """ Un seul entraînement par pli : on ne garde que les probabilités du pli de test """
+    from sklearn.base import clone
+
+    fold_model = clone(model)
+    fold_model.fit(_take(X, train_idx), _take(y, train_idx))
+    return test_idx, fold_model.predict_proba(_take(X, test_idx))[:, 1]
+
+
+def _take(data, idx):
+    return data.iloc[idx] if hasattr(data, 'iloc') else data[idx]
+
+
+def _fold_metrics(y_true, y_proba, threshold=0.5):
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
+
+    # Même décision que model.predict pour un classifieur binaire
+    y_pred = (y_proba > threshold).astype(int)
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, zero_division=0),
+        'recall': recall_score(y_true, y_pred, zero_division=0),
+        'f1': f1_score(y_true, y_pred, zero_division=0),
+        'roc_auc': roc_auc_score(y_true, y_proba)
+    }
+
+
+def cross_validate_once(model, X, y, cv_folds=5, random_state=42, n_jobs=-1):
+    """
+    Validation croisée en un seul passage : chaque pli est entraîné une fois (en parallèle),
+    les probabilités hors-pli sont gardées en cache et toutes les métriques en sont dérivées.
+    Retourne (cv_results, oof_proba, folds).
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    cv = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=random_state)
+    y_arr = np.asarray(y)
+    folds = list(cv.split(np.zeros(len(y_arr)), y_arr))
+
+    # Les forêts des plis tournent déjà en parallèle : chaque forêt utilise un seul cœur
+    fold_model = model
+    if 'n_jobs' in model.get_params():
+        from sklearn.base import clone
+        fold_model = clone(model).set_params(n_jobs=1)
+
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold_proba)(fold_model, X, y_arr, train_idx, test_idx)
+        for train_idx, test_idx in folds
+    )
+
+    oof_proba = np.empty(len(y_arr), dtype=np.float64)
+    fold_scores = {metric: [] for metric in SCORING_METRICS}
+    for test_idx, proba in outputs:
+        oof_proba[test_idx] = proba
+        for metric, value in _fold_metrics(y_arr[test_idx], proba).items():
+            fold_scores[metric].append(value)
+
+    cv_results = {}
+    for metric in SCORING_METRICS:
+        scores = np.asarray(fold_scores[metric])
+        cv_results[metric] = {
+            'scores': scores,
+            'mean': scores.mean(),
+            'std': scores.std(),
+            'min': scores.min(),
+            'max': scores.max()
+        }
+    return cv_results, oof_proba, folds
+
+
+# --- ANALYSE DES ERREURS ---
+# Buckets de la matrice de confusion, codés 2 * vrai + prédit
+ERROR_BUCKETS = ['True_Negative', 'False_Positive', 'False_Negative', 'True_Positive']
+
+
+def error_buckets(y_true, y_proba, threshold=0.5):
+    """ Code du bucket de chaque ligne : 0=TN, 1=FP, 2=FN, 3=TP (décision : proba >= seuil) """
+    y_pred = np.asarray(y_proba) >= threshold
+    return (2 * np.asarray(y_true).astype(np.int8) + y_pred).astype(np.int8)
+
+
+def analyze_errors(y_true, y_proba, X=None, rows=None, threshold=0.5, amount_column='Amount',
+                   feature_columns=None, verbose=True):
+    """
+    Analyse des erreurs à partir du vecteur de probabilités (test ou hors-pli) :
+    la matrice de features n'est jamais copiée, seules les colonnes demandées sont lues
+    aux positions `rows` (ex. X=df brut et rows=X_test.index pour des montants en €).
+    Buckets, coûts et moyennes/écarts-types par bucket en un passage (np.bincount).
+    """
+    y_true = np.asarray(y_true)
+    y_proba = np.asarray(y_proba, dtype=np.float64)
+    bucket = error_buckets(y_true, y_proba, threshold)
+    counts = np.bincount(bucket, minlength=4)
+
+    def column(name):
+        values = np.asarray(X[name], dtype=np.float64)
+        return values if rows is None else values[rows]
+
+    amount = column(amount_column) if X is not None and amount_column in X else None
+    feature_columns = list(feature_columns or [])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means, stds = {}, {}
+        for name in feature_columns:
+            values = column(name)
+            sums = np.bincount(bucket, weights=values, minlength=4)
+            squares = np.bincount(bucket, weights=values * values, minlength=4)
+            means[name] = sums / counts
+            stds[name] = np.sqrt(np.maximum(squares / counts - means[name] ** 2, 0.0))
+        mean_proba = np.bincount(bucket, weights=y_proba, minlength=4) / counts
+
+    cost = {'false_positive_count': int(counts[1]), 'false_negative_count': int(counts[2])}
+    if amount is not None:
+        amount_sums = np.bincount(bucket, weights=amount, minlength=4)
+        cost.update({
+            'missed_fraud_amount': float(amount_sums[2]),
+            'caught_fraud_amount': float(amount_sums[3]),
+            'false_positive_amount': float(amount_sums[1])
+        })
+
+    summary = pd.DataFrame({'count': counts, 'mean_probability': mean_proba}, index=ERROR_BUCKETS)
+    if amount is not None:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            summary['mean_amount'] = amount_sums / counts
+
+    if verbose:
+        n = len(bucket)
+        print("  Analyse des erreurs de prédiction:")
+        print(f"Total des prédictions: {n}")
+        print(f"Prédictions correctes: {counts[0] + counts[3]} ({(counts[0] + counts[3]) / n * 100:.1f}%)")
+        print(f"Faux Positifs (FP):    {counts[1]} ({counts[1] / n * 100:.1f}%)")
+        print(f"Faux Négatifs (FN):    {counts[2]} ({counts[2] / n * 100:.1f}%)")
+        if amount is not None:
+            print(f"Montant des fraudes manquées: €{cost['missed_fraud_amount']:,.2f}")
+            print(f"Montant des fraudes détectées: €{cost['caught_fraud_amount']:,.2f}")
+
+    return {
+        'bucket': bucket,
+        'probability': y_proba,
+        'amount': amount,
+        'counts': dict(zip(ERROR_BUCKETS, counts.tolist())),
+        'cost': cost,
+        'summary': summary,
+        'feature_means': pd.DataFrame(means, index=ERROR_BUCKETS),
+        'feature_stds': pd.DataFrame(stds, index=ERROR_BUCKETS)
+    }
+
+
+# --- ANALYSE DU SEUIL ---
+# Un seul tri des scores : les matrices de confusion à tous les seuils distincts sont obtenues
+# par sommes cumulées (O(n log n)), au lieu d'une passe complète par seuil essayé.
+THRESHOLD_OBJECTIVES = ['f1', 'recall_at_fpr', 'cost']
+# Coût d'un faux positif (vérification par un analyste, friction client), en €
+DEFAULT_FP_COST = 5.0
+DEFAULT_MAX_FPR = 0.001
+
+
+def threshold_sweep(y_true, y_proba, amount=None, fp_cost=DEFAULT_FP_COST):
+    """
+    Matrice de confusion et métriques pour chaque seuil distinct (décision : proba >= seuil),
+    par seuil décroissant. Avec `amount`, la colonne `cost` vaut
+    montant des fraudes manquées + fp_cost * nombre de faux positifs.
+    """
+    y_true = np.asarray(y_true).astype(np.int64)
+    y_proba = np.asarray(y_proba, dtype=np.float64)
+    order = np.argsort(-y_proba, kind='stable')
+    sorted_proba = y_proba[order]
+    sorted_true = y_true[order]
+
+    # Dernière position de chaque groupe de scores égaux : tout ce qui précède est signalé.
+    # Première ligne : seuil infini, aucune transaction signalée.
+    last = np.r_[np.flatnonzero(np.diff(sorted_proba)), len(sorted_proba) - 1]
+    tp = np.r_[0, np.cumsum(sorted_true)[last]]
+    fp = np.r_[0, last + 1] - tp
+    n_pos = int(y_true.sum())
+    n_neg = len(y_true) - n_pos
+    fn = n_pos - tp
+    tn = n_neg - fp
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sweep = pd.DataFrame({
+            'threshold': np.r_[np.inf, sorted_proba[last]],
+            'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+            # Convention de precision_recall_curve : précision 1 quand rien n'est signalé
+            'precision': np.where(tp + fp > 0, tp / (tp + fp), 1.0),
+            'recall': tp / n_pos if n_pos else np.zeros(len(tp)),
+            'f1': 2 * tp / (2 * tp + fp + fn),
+            'fpr': fp / n_neg if n_neg else np.zeros(len(fp)),
+            'accuracy': (tp + tn) / len(y_true)
+        })
+    if amount is not None:
+        fraud_amount = np.asarray(amount, dtype=np.float64)[order] * sorted_true
+        caught = np.r_[0.0, np.cumsum(fraud_amount)[last]]
+        sweep['missed_fraud_amount'] = fraud_amount.sum() - caught
+        sweep['cost'] = sweep['missed_fraud_amount'] + fp_cost * fp
+    return sweep
+
+
+def metrics_at_threshold(sweep, threshold):
+    """ Ligne du balayage correspondant à `proba >= threshold` (recherche dichotomique, sans repasser sur les données) """
+    # Seuils décroissants : dernier seuil du balayage >= threshold (la ligne infinie existe toujours)
+    position = int(np.searchsorted(-sweep['threshold'].to_numpy(), -threshold, side='right')) - 1
+    row = sweep.iloc[position].copy()
+    row['threshold'] = threshold
+    return row
+
+
+def optimize_threshold(sweep, objective='f1', max_fpr=DEFAULT_MAX_FPR):
+    """
+    Seuil optimal selon `objective` :
+      'f1'            : F1 maximal
+      'recall_at_fpr' : rappel maximal avec un taux de faux positifs <= max_fpr
+      'cost'          : coût minimal (balayage calculé avec `amount`)
+    Seuls les seuils finis sont candidats : la ligne infinie (rien n'est signalé) n'est pas un modèle utilisable.
+    Retourne (seuil, ligne du balayage).
+    """
+    candidates = sweep[np.isfinite(sweep['threshold'].to_numpy())]
+    if not len(candidates):
+        raise ValueError("Balayage vide : aucun seuil fini")
+    if objective == 'f1':
+        position = int(np.nanargmax(candidates['f1'].to_numpy()))
+    elif objective == 'recall_at_fpr':
+        # Le rappel croît quand le seuil baisse : dernier seuil encore admissible
+        admissible = np.flatnonzero(candidates['fpr'].to_numpy() <= max_fpr)
+        if not len(admissible):
+            raise ValueError(f"Aucun seuil ne respecte un taux de faux positifs <= {max_fpr} "
+                             f"(minimum atteignable : {candidates['fpr'].min():.5f})")
+        position = int(admissible[-1])
+    elif objective == 'cost':
+        if 'cost' not in sweep:
+            raise ValueError("L'objectif 'cost' nécessite un balayage calculé avec `amount`")
+        position = int(np.argmin(candidates['cost'].to_numpy()))
+    else:
+        raise ValueError(f"Objectif inconnu : {objective} (choix : {THRESHOLD_OBJECTIVES})")
+    row = candidates.iloc[position]
+    return float(row['threshold']), row
+
+
+def main(argv=None):
+    import argparse
+    import os
+
+    from model_bundle import DEFAULT_BUNDLE_DIR, load_bundle, update_bundle_threshold
+    from scoring import (DEFAULT_CHUNKSIZE, iter_transaction_chunks, load_model_and_scaler,
+                         save_threshold, score_chunk)
+    from velocity_features import VelocityState
+
+    parser = argparse.ArgumentParser(
+        description="Choisit le seuil de décision sur un fichier étiqueté et l'écrit dans le modèle"
+    )
+    parser.add_argument('input', help="Fichier CSV ou Parquet étiqueté (colonne Class), hors entraînement")
+    parser.add_argument('--objective', choices=THRESHOLD_OBJECTIVES, default='f1')
+    parser.add_argument('--max-fpr', type=float, default=DEFAULT_MAX_FPR)
+    parser.add_argument('--fp-cost', type=float, default=DEFAULT_FP_COST, help="Coût d'un faux positif (€)")
+    parser.add_argument('--bundle', default=DEFAULT_BUNDLE_DIR)
+    parser.add_argument('--model', default='modele_fraude.joblib', help="Utilisé si le bundle est absent")
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Affiche le seuil sans l'écrire")
+    args = parser.parse_args(argv)
+
+    use_bundle = os.path.isdir(args.bundle)
+    if use_bundle:
+        bundle = load_bundle(args.bundle)
+        model, scaler = bundle.forest, bundle.scaler
+    else:
+        model, scaler = load_model_and_scaler(args.model, args.scaler)
+
+    # Seuls les vecteurs proba / classe / montant sont gardés en mémoire
+    proba, y_true, amount = [], [], []
+    # Un seul flux de vélocité pour tout le fichier : mêmes features qu'en production
+    velocity_state = VelocityState()
+    for chunk in iter_transaction_chunks(args.input, args.chunksize):
+        scored = score_chunk(chunk, model, scaler, velocity_state=velocity_state)
+        proba.append(scored['fraud_probability'].to_numpy())
+        y_true.append(chunk['Class'].to_numpy())
+        amount.append(chunk['Amount'].to_numpy(dtype=np.float64))
+
+    sweep = threshold_sweep(np.concatenate(y_true), np.concatenate(proba),
+                            amount=np.concatenate(amount), fp_cost=args.fp_cost)
+    try:
+        threshold, row = optimize_threshold(sweep, args.objective, max_fpr=args.max_fpr)
+    except ValueError as exc:
+        # Rien n'est écrit : le seuil courant reste en place
+        raise SystemExit(f"Seuil non modifié : {exc}")
+    details = {
+        'objective': args.objective,
+        'max_fpr': args.max_fpr,
+        'fp_cost': args.fp_cost,
+        'source': os.path.basename(args.input),
+        **{k: float(row[k]) for k in ['precision', 'recall', 'f1', 'fpr', 'cost', 'missed_fraud_amount']},
+        **{k: int(row[k]) for k in ['tp', 'fp', 'fn', 'tn']}
+    }
+    print(f"Seuil optimal ({args.objective}) : {threshold:.4f}")
+    print(f"  Precision {row['precision']:.4f} | Recall {row['recall']:.4f} | F1 {row['f1']:.4f} | FPR {row['fpr']:.5f}")
+    print(f"  TP {int(row['tp'])}, FP {int(row['fp'])}, FN {int(row['fn'])}, TN {int(row['tn'])}")
+    print(f"  Fraudes manquées : €{row['missed_fraud_amount']:,.2f} | Coût total : €{row['cost']:,.2f}")
+
+    if args.dry_run:
+        return
+    if use_bundle:
+        print(f"Seuil écrit dans {update_bundle_threshold(args.bundle, threshold, **details)}")
+    else:
+        print(f"Seuil écrit dans {save_threshold(threshold, args.model, **details)}")
+
+
+if __name__ == '__main__':
+    main()
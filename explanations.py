@@ -0,0 +1,111 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from fast_forest import DEFAULT_BLOCK_SIZE, FlatForest
+
+# --- EXPLICATIONS PAR CHEMIN ---
+# Contribution de chaque feature à la probabilité de fraude, lue directement dans les tableaux
+# de la forêt aplatie : à chaque nœud traversé, la variation de probabilité entre le nœud et
+# le fils emprunté est attribuée à la feature testée (décomposition de Saabas).
+# proba = biais (moyenne des racines) + somme des contributions, exactement.
+DEFAULT_TOP_K = 3
+# Explainers gardés en cache : les versions publiées successivement ne restent pas en mémoire
+DEFAULT_MAX_EXPLAINERS = 2
+
+
+class PathExplainer:
+    """ Tableaux précalculés une fois par version du modèle ; explications vectorisées par blocs """
+
+    def __init__(self, forest, positive_class=1, max_cached_rows=1024):
+        self.forest = forest
+        self.feature_names = list(forest.feature_names_in_) if forest.feature_names_in_ is not None else None
+        class_idx = int(np.flatnonzero(np.asarray(forest.classes_) == positive_class)[0])
+        node_value = forest.node_proba()[:, class_idx]
+        # Variation de probabilité pour chaque fils, alignée sur `children` (2 * nœud + aller_à_droite)
+        self.child_delta = node_value[forest.children] - np.repeat(node_value, 2)
+        self.bias = float(node_value[forest.roots].mean())
+        self.n_features = int(forest.feature.max()) + 1 if self.feature_names is None else len(self.feature_names)
+        self.max_cached_rows = max_cached_rows
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contributions(self, X, block_size=DEFAULT_BLOCK_SIZE):
+        """ Matrice (n_samples, n_features) des contributions à la probabilité de fraude """
+        forest = self.forest
+        X = forest._validate(X)
+        n_samples, n_features = X.shape
+        contrib = np.empty((n_samples, n_features), dtype=np.float64)
+
+        for start in range(0, n_samples, block_size):
+            block = X[start:start + block_size]
+            n_block = len(block)
+            row_offsets = (np.arange(n_block, dtype=np.int64) * n_features)[:, np.newaxis]
+            flat_X = block.ravel()
+            node = np.broadcast_to(forest.roots, (n_block, forest.n_trees)).copy()
+            acc = np.zeros(n_block * n_features, dtype=np.float64)
+            for _ in range(forest.max_depth):
+                feature = forest.feature[node]
+                go_right = flat_X[row_offsets + feature] > forest.threshold[node]
+                child_idx = 2 * node + go_right
+                # Sur une feuille le fils est le nœud lui-même : variation nulle
+                acc += np.bincount((row_offsets + feature).ravel(), weights=self.child_delta[child_idx].ravel(),
+                                   minlength=n_block * n_features)
+                node = forest.children[child_idx]
+            contrib[start:start + n_block] = acc.reshape(n_block, n_features)
+
+        contrib /= forest.n_trees
+        return contrib
+
+    def explain_row(self, x):
+        """ Contributions d'une seule transaction (mémorisées : les mêmes alertes reviennent souvent) """
+        x = self.forest._validate(x)
+        key = x.tobytes()
+        with self._lock:
+            if key in self._rows:
+                self._rows.move_to_end(key)
+                return self._rows[key]
+        contrib = self.contributions(x)[0]
+        with self._lock:
+            self._rows[key] = contrib
+            while len(self._rows) > self.max_cached_rows:
+                self._rows.popitem(last=False)
+        return contrib
+
+    def top_drivers(self, contrib, k=DEFAULT_TOP_K):
+        """ Pour chaque ligne, les `k` features qui poussent le plus vers la fraude : [(nom, contribution)] """
+        contrib = np.atleast_2d(contrib)
+        names = self.feature_names or [str(i) for i in range(contrib.shape[1])]
+        top = np.argsort(-contrib, axis=1, kind='stable')[:, :k]
+        return [[(names[j], float(row[j])) for j in idx] for row, idx in zip(contrib, top)]
+
+
+def format_drivers(drivers):
+    """ [('V14', 0.31), ('V17', 0.2)] -> 'V14:+0.310 | V17:+0.200' """
+    return ' | '.join(f"{name}:{value:+.3f}" for name, value in drivers)
+
+
+# Un explainer par version de modèle (les tableaux dérivés ne sont calculés qu'une fois), en LRU borné.
+# Chaque entrée garde une référence faible vers le modèle : un autre objet (même id après
+# libération, ou même version rechargée) reconstruit son explainer.
+_EXPLAINERS = OrderedDict()
+_EXPLAINERS_LOCK = threading.Lock()
+
+
+def explainer_for(model, model_version=None, max_cached=DEFAULT_MAX_EXPLAINERS):
+    """ Explainer en cache pour ce modèle (FlatForest ou forêt sklearn) et cette version """
+    key = model_version if model_version is not None else ('id', id(model))
+    with _EXPLAINERS_LOCK:
+        entry = _EXPLAINERS.get(key)
+        if entry is not None and entry[0]() is model:
+            _EXPLAINERS.move_to_end(key)
+            return entry[1]
+        forest = model if isinstance(model, FlatForest) else FlatForest.from_sklearn(model)
+        explainer = PathExplainer(forest)
+        _EXPLAINERS[key] = (weakref.ref(model), explainer)
+        _EXPLAINERS.move_to_end(key)
+        while len(_EXPLAINERS) > max_cached:
+            _EXPLAINERS.popitem(last=False)
+        return explainer
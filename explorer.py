@@ -0,0 +1,174 @@
+import json
+import operator
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from data_loader import columnar_cache_version, ensure_columnar_cache
+
+# --- EXPLORATEUR PAGINÉ ---
+# Le dataset complet reste dans le cache Feather en memory map : un filtre ne produit qu'un tableau
+# d'indices de lignes, et seule la page affichée est matérialisée en DataFrame.
+# Les index de tri (Amount, Time) sont calculés une fois par version du dataset et relus en memory map.
+SORT_COLUMNS = ['Amount', 'Time']
+CONDITION_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+
+class DatasetExplorer:
+    """ Filtrage, tri et pagination côté serveur sur une table Arrow (memory map ou en mémoire) """
+
+    def __init__(self, table, index_dir=None, version=None, max_cached_queries=8):
+        self.table = table
+        self.index_dir = index_dir
+        self.version = version
+        self.max_cached_queries = max_cached_queries
+        self._columns = {}
+        self._sort_indexes = {}
+        self._queries = OrderedDict()
+
+    @classmethod
+    def from_csv(cls, csv_path='creditcard.csv'):
+        """ Dataset complet via le cache colonnaire ; les index de tri sont stockés à côté """
+        import pyarrow.feather as feather
+
+        cache_path = ensure_columnar_cache(csv_path)
+        table = feather.read_table(cache_path, memory_map=True)
+        base, _ = os.path.splitext(cache_path)
+        return cls(table, index_dir=base + '_index', version=columnar_cache_version(csv_path))
+
+    @classmethod
+    def from_frame(cls, df):
+        """ Petit DataFrame déjà en mémoire (index de tri gardés en mémoire) """
+        import pyarrow as pa
+        return cls(pa.Table.from_pandas(df, preserve_index=False))
+
+    @property
+    def n_rows(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def _column(self, name):
+        """ Colonne en tableau NumPy (une seule conversion par colonne, partagée par les requêtes) """
+        if name not in self._columns:
+            self._columns[name] = self.table.column(name).to_numpy()
+        return self._columns[name]
+
+    # --- INDEX DE TRI ---
+
+    def sort_index(self, column):
+        """ (ordre des lignes trié par `column`, valeurs triées) ; relu depuis le disque si à jour """
+        if column in self._sort_indexes:
+            return self._sort_indexes[column]
+
+        order_path = sorted_path = None
+        if self.index_dir:
+            order_path = os.path.join(self.index_dir, f"{column}.order.npy")
+            sorted_path = os.path.join(self.index_dir, f"{column}.sorted.npy")
+            if self._index_is_current() and os.path.exists(order_path) and os.path.exists(sorted_path):
+                index = (np.load(order_path, mmap_mode='r'), np.load(sorted_path, mmap_mode='r'))
+                self._sort_indexes[column] = index
+                return index
+
+        values = self._column(column)
+        order = np.argsort(values, kind='stable')
+        order = order.astype(np.int32 if self.n_rows < 2 ** 31 else np.int64)
+        index = (order, values[order])
+        if self.index_dir:
+            self._write_index(order_path, index[0])
+            self._write_index(sorted_path, index[1])
+        self._sort_indexes[column] = index
+        return index
+
+    def _index_is_current(self):
+        meta_path = os.path.join(self.index_dir, 'index.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            return json.load(f).get('version') == self.version
+
+    def _write_index(self, path, array):
+        os.makedirs(self.index_dir, exist_ok=True)
+        meta_path = os.path.join(self.index_dir, 'index.json')
+        if not self._index_is_current():
+            # Nouvelle version du dataset : les anciens index sont invalidés avant d'écrire
+            for name in os.listdir(self.index_dir):
+                os.remove(os.path.join(self.index_dir, name))
+            with open(meta_path, 'w') as f:
+                json.dump({'version': self.version, 'rows': self.n_rows}, f, indent=4)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+
+    # --- REQUÊTES ---
+
+    def filter_ids(self, classes=None, amount_range=None, time_range=None, conditions=(),
+                   sort_by=None, ascending=True):
+        """
+        Indices des lignes qui passent tous les filtres, dans l'ordre d'affichage.
+        `conditions` : liste de (feature, opérateur, valeur), ex. [('V14', '<', -5)].
+        Le filtre de plage sur la colonne de tri est résolu par recherche dichotomique dans l'index.
+        """
+        key = json.dumps([classes, amount_range, time_range, conditions, sort_by, ascending], default=str)
+        if key in self._queries:
+            self._queries.move_to_end(key)
+            return self._queries[key]
+
+        ranges = {'Amount': amount_range, 'Time': time_range}
+        mask = None
+
+        def restrict(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if classes is not None:
+            restrict(np.isin(self._column('Class'), classes))
+        for column, bounds in ranges.items():
+            if bounds is not None and column != sort_by:
+                values = self._column(column)
+                restrict((values >= bounds[0]) & (values <= bounds[1]))
+        for feature, op, value in conditions:
+            if op not in CONDITION_OPERATORS:
+                raise ValueError(f"Opérateur inconnu : {op} (choix : {list(CONDITION_OPERATORS)})")
+            restrict(CONDITION_OPERATORS[op](self._column(feature), value))
+
+        if sort_by is None:
+            ids = np.flatnonzero(mask) if mask is not None else np.arange(self.n_rows)
+        else:
+            order, sorted_values = self.sort_index(sort_by)
+            lo, hi = 0, len(order)
+            bounds = ranges.get(sort_by)
+            if bounds is not None:
+                lo = np.searchsorted(sorted_values, bounds[0], side='left')
+                hi = np.searchsorted(sorted_values, bounds[1], side='right')
+            ids = np.asarray(order[lo:hi])
+            if mask is not None:
+                ids = ids[mask[ids]]
+            if not ascending:
+                ids = ids[::-1]
+
+        self._queries[key] = ids
+        while len(self._queries) > self.max_cached_queries:
+            self._queries.popitem(last=False)
+        return ids
+
+    def page(self, ids, page=0, page_size=50):
+        """ Matérialise uniquement la page demandée (index = numéro de ligne dans le dataset) """
+        start = page * page_size
+        page_ids = np.asarray(ids[start:start + page_size])
+        df = self.table.take(page_ids).to_pandas()
+        df.index = page_ids
+        return df
+
+    def query(self, page=0, page_size=50, **filters):
+        """ Retourne (page filtrée en DataFrame, nombre total de lignes correspondantes) """
+        ids = self.filter_ids(**filters)
+        return self.page(ids, page, page_size), len(ids)
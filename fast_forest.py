@@ -0,0 +1,243 @@
+import argparse
+import time
+
+import numpy as np
+
+# Taille des blocs de lignes pour le parcours vectorisé des gros lots
+DEFAULT_BLOCK_SIZE = 1024
+
+
+class FlatForest:
+    """
+    Forêt aléatoire aplatie dans des tableaux NumPy contigus (un seul jeu de nœuds pour tous les arbres).
+    Les feuilles bouclent sur elles-mêmes : on peut donc parcourir tous les arbres en
+    `max_depth` itérations, sans masque ni test de fin.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 classes, feature_names=None, children=None, value_scale=None):
+        self.feature = feature          # (n_nodes,) int32 : feature testée
+        self.threshold = threshold      # (n_nodes,) float64 : seuil (x <= seuil -> gauche)
+        self.left = left                # (n_nodes,) int32 : fils gauche (indice global), facultatif si `children`
+        self.right = right              # (n_nodes,) int32 : fils droit (indice global), facultatif si `children`
+        self.value = value              # (n_nodes, n_classes) float64 : probabilités normalisées
+        # Forêt compressée : `value` entier (niveaux quantifiés), probabilité = value * value_scale
+        self.value_scale = float(value_scale) if value_scale is not None else None
+        self.roots = roots              # (n_trees,) int32 : racine de chaque arbre
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.feature_names_in_ = feature_names
+        # Fils entrelacés [gauche, droit] : un seul accès mémoire par niveau
+        self.children = children if children is not None else np.stack([left, right], axis=1).ravel()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """ Aplatit un RandomForestClassifier (ou ExtraTreesClassifier) entraîné """
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+            feature = np.where(is_leaf, 0, tree.feature)
+
+            # Même normalisation que DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value = value / normalizer
+
+            features.append(feature)
+            thresholds.append(tree.threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.int32),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.int32),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+            feature_names=getattr(model, 'feature_names_in_', None)
+        )
+
+    def to_arrays(self):
+        """ Dictionnaire de tableaux, pratique pour joblib.dump / np.save """
+        return {
+            'feature': self.feature, 'threshold': self.threshold,
+            'left': self.left, 'right': self.right, 'children': self.children,
+            'value': self.value, 'roots': self.roots, 'max_depth': np.int64(self.max_depth),
+            'classes': self.classes_,
+            'value_scale': np.float64(self.value_scale) if self.value_scale is not None else None,
+            'feature_names': (np.asarray(self.feature_names_in_, dtype=object)
+                              if self.feature_names_in_ is not None else None)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        feature_names = arrays.get('feature_names')
+        return cls(
+            feature=arrays['feature'], threshold=arrays['threshold'],
+            left=arrays.get('left'), right=arrays.get('right'), value=arrays['value'],
+            roots=arrays['roots'], max_depth=int(arrays['max_depth']),
+            classes=arrays['classes'],
+            feature_names=list(feature_names) if feature_names is not None else None,
+            children=arrays.get('children'),
+            value_scale=arrays.get('value_scale')
+        )
+
+    def node_proba(self):
+        """ Probabilités de chaque nœud en float64 (valeurs quantifiées ramenées en probabilités) """
+        if self.value_scale is None:
+            return np.asarray(self.value, dtype=np.float64)
+        return self.value.astype(np.float64) * self.value_scale
+
+    def _sum_leaves(self, leaf_values):
+        """ Somme sur l'axe des arbres, en float64 ; en entiers (exacte) si les valeurs sont quantifiées """
+        if self.value_scale is None:
+            return np.add.reduce(leaf_values, axis=0, dtype=np.float64)
+        return np.add.reduce(leaf_values, axis=0, dtype=np.int64) * self.value_scale
+
+    # --- PARCOURS ---
+
+    def apply(self, X):
+        """ Indices (globaux) des feuilles atteintes : tableau (n_samples, n_trees) """
+        X = self._validate(X)
+        nodes = np.empty((X.shape[0], self.n_trees), dtype=np.int32)
+        for start in range(0, X.shape[0], DEFAULT_BLOCK_SIZE):
+            block = X[start:start + DEFAULT_BLOCK_SIZE]
+            nodes[start:start + len(block)] = self._apply_block(block)
+        return nodes
+
+    def _apply_block(self, X):
+        n_samples, n_features = X.shape
+        # Indexation à plat de X : plus rapide qu'un accès X[rows, cols]
+        row_offsets = (np.arange(n_samples, dtype=np.int64) * n_features)[:, np.newaxis]
+        flat_X = X.ravel()
+        node = np.broadcast_to(self.roots, (n_samples, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_offsets + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + go_right]
+        return node
+
+    def _apply_row(self, x):
+        node = self.roots
+        for _ in range(self.max_depth):
+            go_right = x[self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + go_right]
+        return node
+
+    def predict_proba(self, X, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Probabilités identiques bit à bit à RandomForestClassifier.predict_proba :
+        X est converti en float32 comme dans sklearn, les arbres sont accumulés dans l'ordre.
+        """
+        X = self._validate(X)
+
+        # Chemin rapide : une seule transaction
+        if X.shape[0] == 1:
+            leaves = self._apply_row(X[0])
+            return (self._sum_leaves(self.value[leaves]) / self.n_trees)[np.newaxis, :]
+
+        # Chemin par blocs : on borne la mémoire des tableaux (bloc, n_trees)
+        proba = np.empty((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], block_size):
+            block = X[start:start + block_size]
+            leaves = self._apply_block(block)
+            proba[start:start + len(block)] = self._sum_leaves(self.value[leaves.T])
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def _validate(self, X):
+        if hasattr(X, 'to_numpy'):
+            if self.feature_names_in_ is not None:
+                X = X[list(self.feature_names_in_)]
+            X = X.to_numpy()
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        return X
+
+
+def benchmark_single_row(model, flat_forest, X, n_iter=500):
+    """ Latence (ms) d'une prédiction unitaire : sklearn vs forêt aplatie """
+    X = np.asarray(X, dtype=np.float32)
+    timings = {'sklearn': [], 'flat_forest': []}
+    for i in range(n_iter):
+        row = X[i % len(X)][np.newaxis, :]
+
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings['sklearn'].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        flat_forest.predict_proba(row)
+        timings['flat_forest'].append((time.perf_counter() - start) * 1000)
+
+    return {
+        name: {
+            'p50_ms': float(np.percentile(values, 50)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'mean_ms': float(np.mean(values))
+        }
+        for name, values in timings.items()
+    }
+
+
+def main(argv=None):
+    import joblib
+    import warnings
+
+    warnings.filterwarnings('ignore')
+
+    parser = argparse.ArgumentParser(description="Compare la latence unitaire sklearn vs forêt aplatie")
+    parser.add_argument('--model', default='modele_fraude.joblib')
+    parser.add_argument('--n-iter', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    model = joblib.load(args.model)
+    flat_forest = FlatForest.from_sklearn(model)
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(0, 1, size=(max(args.n_iter, 1000), model.n_features_in_)).astype(np.float32)
+
+    # Vérification bit à bit (accumulation séquentielle des arbres côté sklearn)
+    n_jobs = model.n_jobs
+    model.set_params(n_jobs=1)
+    identical = np.array_equal(model.predict_proba(X), flat_forest.predict_proba(X))
+    print(f"Probabilités identiques à sklearn : {identical}")
+
+    results = benchmark_single_row(model, flat_forest, X, n_iter=args.n_iter)
+    model.set_params(n_jobs=n_jobs)
+    results['sklearn_n_jobs'] = n_jobs
+    sk_results = benchmark_single_row(model, flat_forest, X, n_iter=args.n_iter)['sklearn']
+
+    print(f"\n{'Moteur':<26s}{'p50 (ms)':>10s}{'p99 (ms)':>10s}")
+    print(f"{'sklearn (n_jobs=1)':<26s}{results['sklearn']['p50_ms']:>10.3f}{results['sklearn']['p99_ms']:>10.3f}")
+    print(f"{f'sklearn (n_jobs={n_jobs})':<26s}{sk_results['p50_ms']:>10.3f}{sk_results['p99_ms']:>10.3f}")
+    print(f"{'Forêt aplatie':<26s}{results['flat_forest']['p50_ms']:>10.3f}{results['flat_forest']['p99_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+# --- INSTRUMENTATION DES ÉTAPES ---
+# Un histogramme log-linéaire (à la HdrHistogram) par étape : mémoire fixe, enregistrement O(1),
+# percentiles à ~1 % près. Le registre vit au niveau du module : dans Streamlit il survit aux reruns
+# et il est partagé par toutes les sessions du processus.
+SUB_BUCKET_BITS = 7
+MAX_VALUE_US = 3600 * 10 ** 6
+
+
+class LatencyHistogram:
+    """
+    Durées en microsecondes : valeurs exactes sous 128 µs, puis 64 sous-intervalles
+    par puissance de 2 (erreur relative < 1/64).
+    """
+
+    def __init__(self, max_value_us=MAX_VALUE_US):
+        self.sub_buckets = 1 << SUB_BUCKET_BITS
+        self.half = self.sub_buckets // 2
+        n_shifts = max(1, max_value_us.bit_length() - SUB_BUCKET_BITS + 1)
+        self.counts = np.zeros(self.sub_buckets + n_shifts * self.half, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts[:] = 0
+            self.count = 0
+            self.items = 0
+            self.total_s = 0.0
+            self.max_s = 0.0
+            self.started_at = time.time()
+
+    def _index(self, value_us):
+        if value_us < self.sub_buckets:
+            return value_us
+        shift = value_us.bit_length() - SUB_BUCKET_BITS
+        index = self.sub_buckets + (shift - 1) * self.half + (value_us >> shift) - self.half
+        return min(index, len(self.counts) - 1)
+
+    def _value_at(self, index):
+        """ Milieu de l'intervalle `index`, en microsecondes """
+        if index < self.sub_buckets:
+            return float(index)
+        k = index - self.sub_buckets
+        shift = k // self.half + 1
+        low = (k % self.half + self.half) << shift
+        return low + (1 << shift) / 2
+
+    def record(self, seconds, n_items=1):
+        index = self._index(max(0, int(seconds * 1e6)))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.items += n_items
+            self.total_s += seconds
+            self.max_s = max(self.max_s, seconds)
+
+    def percentile(self, p):
+        """ Percentile en millisecondes (None si rien n'a été enregistré) """
+        with self._lock:
+            if self.count == 0:
+                return None
+            cumulative = np.cumsum(self.counts)
+            rank = max(1, int(np.ceil(p / 100 * self.count)))
+        return self._value_at(int(np.searchsorted(cumulative, rank))) / 1000
+
+    def snapshot(self):
+        elapsed = time.time() - self.started_at
+        stats = {
+            'count': self.count,
+            'items': self.items,
+            'mean_ms': self.total_s / self.count * 1000 if self.count else None,
+            'max_ms': self.max_s * 1000 if self.count else None,
+            # Débit de l'étape : éléments traités par seconde passée dans l'étape
+            'throughput_per_s': self.items / self.total_s if self.total_s > 0 else None,
+            # Fréquence d'appel depuis le démarrage (ou le dernier reset)
+            'calls_per_s': self.count / elapsed if elapsed > 0 else None
+        }
+        for p in (50, 95, 99):
+            stats[f'p{p}_ms'] = self.percentile(p)
+        return stats
+
+
+class Instrumentation:
+    """ Registre des histogrammes par étape (chargement, scaler, vecteur, inférence, rendu...) """
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            return self.histograms[stage]
+
+    def record(self, stage, seconds, n_items=1):
+        self.histogram(stage).record(seconds, n_items)
+
+    @contextmanager
+    def timer(self, stage, n_items=1):
+        """ with timer('forest_inference', n_items=len(X)): ... """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, n_items)
+
+    def timed(self, stage):
+        """ Décorateur : chronomètre chaque appel de la fonction """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self._lock:
+            stages = list(self.histograms.items())
+        return {stage: hist.snapshot() for stage, hist in stages}
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+
+# Registre du processus
+INSTRUMENTATION = Instrumentation()
+timer = INSTRUMENTATION.timer
+timed = INSTRUMENTATION.timed
+record = INSTRUMENTATION.record
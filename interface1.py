@@ -1,10 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
 import warnings
 
+from scoring_service import fetch_service_stats, load_scoring_resources
+from replay import TransactionReplay, format_sim_time
+from streaming_stats import StreamingStats
+from chart_cache import ChartCache, chart_key, render_heatmap, series_chart_spec
+from explorer import DatasetExplorer
+from model_bundle import load_bundle
+
 warnings.filterwarnings('ignore')
 
 # --- CONFIGURATION DE LA PAGE ---
@@ -158,6 +164,46 @@ def load_sample_data():
     })
     return data
 
+@st.cache_resource
+def load_sample_stats():
+    # Statistiques calculées une fois, et non à chaque interaction avec la page
+    data = load_sample_data()
+    return StreamingStats(data.columns, target=None).update(data)
+
+@st.cache_resource
+def load_model_metrics():
+    # Métriques réelles du dernier modèle exporté par le notebook (bundle versionné)
+    try:
+        bundle = load_bundle('modele_fraude_bundle')
+        return bundle.version, bundle.metrics
+    except (FileNotFoundError, ValueError):
+        return None, {}
+
+@st.cache_resource
+def get_replay():
+    # Rejeu partagé par toutes les sessions : creditcard.csv en boucle dans l'ordre de Time
+    # (flux synthétique si le fichier est absent), scoré par le vrai modèle
+    try:
+        model, scaler, threshold = load_scoring_resources()
+    except FileNotFoundError:
+        return None
+    kwargs = dict(threshold=threshold, speedup=60, window_s=60, n_windows=30)
+    if os.path.exists('creditcard.csv'):
+        return TransactionReplay.from_file('creditcard.csv', model, scaler, loop=True, **kwargs)
+    return TransactionReplay.from_synthetic(model, scaler, **kwargs)
+
+@st.cache_resource
+def get_explorer():
+    return DatasetExplorer.from_frame(load_sample_data())
+
+@st.cache_resource
+def get_chart_cache():
+    # Un seul cache de graphiques pour toutes les sessions du processus
+    return ChartCache()
+
+# Version des données simulées (graine + taille) : clé des graphiques en cache
+SAMPLE_DATA_VERSION = 'simulation-42-1000'
+
 # --- SIDEBAR (Menu Gauche) ---
 with st.sidebar:
     # Logo simulé (Bouclier)
@@ -203,31 +249,61 @@ if menu == "Dashboard Global":
     k1, k2, k3, k4 = st.columns(4)
     with k1: st.metric("Transactions (24h)", "12,450", "+12%")
     with k2: st.metric("Menaces Bloquées", "34", "critical")
-    with k3: st.metric("Précision IA", "99.2%", "+0.1%")
-    with k4: st.metric("Latence API", "45ms", "-5ms")
+    model_version, model_metrics = load_model_metrics()
+    with k3:
+        if 'precision' in model_metrics:
+            st.metric("Précision IA", f"{model_metrics['precision']:.1%}", f"modèle {model_version}", delta_color="off")
+        else:
+            st.metric("Précision IA", "N/A", "aucun modèle exporté", delta_color="off")
+    # Latence réellement mesurée par le service de scoring (scoring_service.py)
+    service_stats = fetch_service_stats(os.environ.get('SCORING_SERVICE_URL', 'http://127.0.0.1:8000'))
+    with k4:
+        if service_stats and service_stats['p50_ms'] is not None:
+            st.metric("Latence API (p50)", f"{service_stats['p50_ms']:.1f}ms",
+                      f"p99 {service_stats['p99_ms']:.1f}ms", delta_color="off")
+        else:
+            st.metric("Latence API", "N/A", "service arrêté", delta_color="off")
 
     st.markdown("<br>", unsafe_allow_html=True)
 
     # 3. Zone Inférieure (Graphique + Alertes)
+    # Le rejeu avance à chaque rerun jusqu'au temps simulé courant
+    replay = get_replay()
+    if replay is not None:
+        replay.advance()
     col_left, col_right = st.columns([2, 1])
     
     with col_left:
         st.markdown("#### 📉 Tendances des Menaces")
-        chart_data = pd.DataFrame(np.random.randn(20, 2), columns=['Attaques', 'Blocages'])
-        # Graphique linéaire simple
-        st.line_chart(chart_data)
+        if replay is not None and replay.processed:
+            windows = replay.windows.frame()
+            index = [format_sim_time(t) for t in windows['window_start']]
+            # Fraudes signalées par minute de flux
+            st.line_chart(pd.DataFrame({'Attaques': windows['flagged'].to_numpy()}, index=index), height=220)
+            # Montant bloqué (€) par minute de flux, sur son propre axe (pas à l'échelle d'un nombre d'attaques)
+            st.bar_chart(pd.DataFrame({'Montant bloqué (€)': windows['blocked_amount'].to_numpy()}, index=index),
+                         height=160)
+            summary = replay.summary()
+            st.caption(f"Rejeu x{replay.speedup:g} : {summary['processed']:,} transactions, "
+                       f"{summary['flagged']:,} signalées, {summary['blocked_amount']:,.2f} € bloqués"
+                       + (f" (passage {summary['passes']} du fichier)" if summary['passes'] > 1 else ""))
+        else:
+            st.info("Rejeu indisponible : aucun modèle exporté.")
 
     with col_right:
         # Carte Sombre pour les alertes (Classe .dark-card force le texte blanc)
-        st.markdown("""
+        alerts = replay.recent_alerts(4) if replay is not None else []
+        items = "".join(
+            f"<li>{'🔴' if a['probability'] >= 0.8 else '🟡'} <b>{format_sim_time(a['time'])}</b>"
+            f" - {a['amount']:.2f} € (risque {a['probability']:.0%})</li>"
+            for a in alerts
+        ) or "<li>🟢 Aucune alerte</li>"
+        st.markdown(f"""
         <div class="dark-card">
             <h4>📡 Alertes Système</h4>
             <hr>
             <ul style="padding-left: 20px; line-height: 1.8;">
-                <li>🔴 <b>13:45</b> - IP bloquée (Moscou)</li>
-                <li>🟡 <b>12:30</b> - Seuil volume > 80%</li>
-                <li>🟢 <b>10:00</b> - Mise à jour Modèle v2.4</li>
-                <li>🟢 <b>08:00</b> - Démarrage Services</li>
+                {items}
             </ul>
         </div>
         """, unsafe_allow_html=True)
@@ -274,21 +350,30 @@ elif menu == "Analyse de Transaction":
 
 elif menu == "Explorateur de Données":
     st.markdown("## 💾 Base de Données")
-    df = load_sample_data()
-    st.dataframe(df.head(50), use_container_width=True)
+    explorer = get_explorer()
+    c1, c2, c3 = st.columns(3)
+    with c1: sort_by = st.selectbox("Trier par", ["Aucun", "Amount", "Time"])
+    with c2: descending = st.checkbox("Ordre décroissant")
+    ids = explorer.filter_ids(sort_by=None if sort_by == "Aucun" else sort_by, ascending=not descending)
+    with c3: page = st.number_input("Page", min_value=1, max_value=max(1, -(-len(ids) // 50)), value=1) - 1
+    st.dataframe(explorer.page(ids, page, 50), use_container_width=True)
 
 elif menu == "Intelligence Visuelle":
     st.markdown("## 📊 Visualisation Avancée")
     df = load_sample_data()
+    charts = get_chart_cache()
     
     tab1, tab2 = st.tabs(["Distributions", "Corrélations"])
     
     with tab1:
-        st.bar_chart(df['Amount'].head(50))
+        spec = charts.get(chart_key('amount_bar', SAMPLE_DATA_VERSION, 50),
+                          lambda: series_chart_spec(df['Amount'].head(50), 'bar', 'Transaction', 'Montant'),
+                          kind='json')
+        st.vega_lite_chart(spec, use_container_width=True)
     with tab2:
-        fig, ax = plt.subplots()
-        sns.heatmap(df.corr().iloc[:5,:5], annot=True, ax=ax, cmap="RdBu_r")
-        st.pyplot(fig)
+        heatmap = charts.get(chart_key('heatmap', SAMPLE_DATA_VERSION, 5, 'RdBu_r'),
+                             lambda: render_heatmap(load_sample_stats().corr().iloc[:5,:5], figsize=(6.4, 4.8), cmap="RdBu_r"))
+        st.image(heatmap)
 
 # --- FOOTER ---
 st.markdown("---")
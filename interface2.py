@@ -1,11 +1,26 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import tempfile
+import time
 import warnings
 
+from scoring import (score_file, detect_format, load_model_and_scaler, load_threshold,
+                     predict_with_threshold, FEATURE_COLUMNS)
+from data_loader import load_sample_and_kpis, load_sample_and_kpis_columnar
+from fast_forest import FlatForest
+from model_bundle import load_bundle
+from cascade import load_cascade
+from shared_model import attach, current_version
+from preprocessing import FeaturePipeline
+from velocity_features import VELOCITY_FEATURES, VelocityState
+from streaming_stats import StreamingStats, load_or_build_stats
+from chart_cache import ChartCache, chart_key, frame_version, render_heatmap, series_chart_spec
+from explorer import CONDITION_OPERATORS, DatasetExplorer
+from instrumentation import INSTRUMENTATION, timer
+from explanations import explainer_for
+from scoring_service import fetch_service_stats
+
 warnings.filterwarnings('ignore')
 
 # --- CONFIGURATION DE LA PAGE ---
@@ -55,27 +70,111 @@ st.markdown("""
 @st.cache_resource
 def load_resources():
     try:
-        # Chargement du modèle et du scaler exportés depuis le Notebook
-        model = joblib.load('modele_fraude.joblib')
-        scaler = joblib.load('scaler.joblib')
-        return model, scaler
+        # Bundle versionné exporté par le notebook : forêt en memory map,
+        # schéma exact des features, paramètres du scaler et seuil optimal
+        bundle = load_bundle('modele_fraude_bundle')
+        return bundle.forest, bundle.scaler, bundle.threshold, bundle.feature_names
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        # Schéma vérifié au chargement : un modèle incompatible est refusé ici, pas au premier scoring
+        st.error(f"⚠️ ERREUR CRITIQUE : Modèle incompatible avec le format des transactions. {e}")
+        return None, None, None, None
+    try:
+        # Ancien format : modèle et scaler exportés séparément depuis le Notebook
+        model, scaler = load_model_and_scaler('modele_fraude.joblib', 'scaler.joblib')
+        # Seuil optimal sauvegardé par le notebook (0.5 par défaut)
+        threshold = load_threshold('modele_fraude.joblib')
+        feature_names = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+        return model, scaler, threshold, feature_names
     except FileNotFoundError:
         st.error("⚠️ ERREUR CRITIQUE : Fichiers modèles introuvables. Avez-vous exécuté l'étape 1 ?")
-        return None, None
+        return None, None, None, None
+    except ValueError as e:
+        st.error(f"⚠️ ERREUR CRITIQUE : Modèle incompatible avec le format des transactions. {e}")
+        return None, None, None, None
+
+@st.cache_resource
+def load_fast_model(_model):
+    # Forêt aplatie en tableaux NumPy : prédiction unitaire sans le surcoût d'appel sklearn
+    return _model if isinstance(_model, FlatForest) else FlatForest.from_sklearn(_model)
+
+@st.cache_resource
+def load_pipeline(_scaler, feature_names, model_version=None):
+    # Schéma ordonné + centre/échelle du scaler : le vecteur est assemblé par nom, en float32
+    return FeaturePipeline.from_scaler(_scaler, feature_names)
+
+@st.cache_resource
+def load_cascade_model(_forest, model_version):
+    # Pré-filtre calibré pour cette forêt (python cascade.py) : None s'il est absent ou périmé
+    return load_cascade('modele_fraude_bundle', _forest)
+
+@st.cache_resource(max_entries=2)
+def attach_shared(version):
+    # Segment publié par `python shared_model.py --watch 30` : forêt et échantillon ouverts en memory map,
+    # une seule copie en RAM pour toutes les répliques. Une entrée par version : la nouvelle version
+    # remplace l'ancienne au rerun suivant, sans mélange entre les deux.
+    return attach(version=version)
 
 @st.cache_data
 def load_data():
     try:
-        # On charge une partie du vrai dataset pour les stats
-        df = pd.read_csv('creditcard.csv')
-        # On prend un échantillon si le fichier est trop gros pour la RAM
-        return df.sample(10000, random_state=42) if len(df) > 10000 else df
+        # Cache colonnaire en memory map (converti une seule fois depuis le CSV)
+        return load_sample_and_kpis_columnar('creditcard.csv', sample_size=10000, random_state=42)
+    except ImportError:
+        # Sans pyarrow : lecture par blocs du CSV (échantillon + KPIs exacts sur tout le fichier)
+        return load_sample_and_kpis('creditcard.csv', sample_size=10000, random_state=42)
     except FileNotFoundError:
+        return None, None
+
+@st.cache_resource(ttl=600)
+def load_stats():
+    try:
+        # Statistiques incrémentales : le CSV n'est parcouru qu'une fois, puis seules
+        # les nouvelles partitions du store sont intégrées (toutes les 10 min au plus)
+        return load_or_build_stats('creditcard.csv')
+    except (ImportError, FileNotFoundError):
+        return None
+
+@st.cache_resource
+def get_explorer():
+    try:
+        # Dataset complet en memory map + index de tri Amount/Time (une instance pour toutes les sessions)
+        return DatasetExplorer.from_csv('creditcard.csv')
+    except (ImportError, FileNotFoundError):
         return None
 
+@st.cache_resource
+def get_chart_cache():
+    # Un seul cache de graphiques pour toutes les sessions du processus
+    return ChartCache()
+
 # Chargement
-model, scaler = load_resources()
-df = load_data()
+shared_version = current_version()
+if shared_version is not None:
+    # Version publiée lue une fois par rerun : modèle et données viennent du même instantané
+    with timer('data_load'):
+        shared = attach_shared(shared_version)
+    model = fast_model = shared.forest
+    scaler, threshold, feature_names = shared.scaler, shared.threshold, shared.feature_names
+    df, kpis = shared.sample, shared.kpis
+    model_version = shared.version
+else:
+    # Pas de loader : chaque processus charge ses propres ressources
+    model, scaler, threshold, feature_names = load_resources()
+    fast_model = load_fast_model(model) if model is not None else None
+    with timer('data_load'):
+        df, kpis = load_data()
+    model_version = None
+# Cascade : l'étage 1 écarte le trafic clairement légitime, seuls les candidats passent par la forêt
+scoring_model = (load_cascade_model(fast_model, model_version) or fast_model) if fast_model is not None else None
+stats = load_stats()
+charts = get_chart_cache()
+# Les graphiques ne sont recalculés que quand leurs données changent : ceux tracés sur l'échantillon `df`
+# suivent sa version (instantané publié, sinon empreinte de l'échantillon chargé), ceux tracés sur
+# les statistiques complètes suivent les sources intégrées (CSV + partitions du store)
+data_version = model_version if model_version is not None else frame_version(df)
+stats_version = '|'.join(stats.sources) if stats is not None else data_version
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -87,7 +186,7 @@ with st.sidebar:
         </div>
     """, unsafe_allow_html=True)
     st.markdown("---")
-    menu = st.radio("NAVIGATION", ["Dashboard Global", "Détection Temps Réel", "Explorateur de Données"], label_visibility="collapsed")
+    menu = st.radio("NAVIGATION", ["Dashboard Global", "Détection Temps Réel", "Explorateur de Données", "Performance"], label_visibility="collapsed")
     st.markdown("---")
     
     # Indicateur de chargement du modèle
@@ -97,6 +196,8 @@ with st.sidebar:
         st.error("❌ Modèle manquant")
 
 # --- CONTENU ---
+# Le temps de rendu de la page est enregistré à la fin du script
+render_start = time.perf_counter()
 
 if menu == "Dashboard Global":
     st.markdown("""
@@ -107,13 +208,13 @@ if menu == "Dashboard Global":
     """, unsafe_allow_html=True)
 
     if df is not None:
-        # Calcul des vraies stats
-        fraud_rate = (df['Class'].mean() * 100)
-        total_frauds = df['Class'].sum()
-        avg_fraud_amt = df[df['Class'] == 1]['Amount'].mean()
+        # Vraies stats, calculées sur le fichier complet pendant le chargement
+        fraud_rate = kpis['fraud_rate']
+        total_frauds = kpis['total_frauds']
+        avg_fraud_amt = kpis['avg_fraud_amount']
 
         k1, k2, k3, k4 = st.columns(4)
-        with k1: st.metric("Transactions Analysées", f"{len(df):,}")
+        with k1: st.metric("Transactions Analysées", f"{kpis['n_transactions']:,}")
         with k2: st.metric("Fraudes Détectées", f"{total_frauds}", "Dataset")
         with k3: st.metric("Taux de Fraude", f"{fraud_rate:.3f}%")
         with k4: st.metric("Montant Moyen (Fraude)", f"{avg_fraud_amt:.2f} €")
@@ -121,7 +222,10 @@ if menu == "Dashboard Global":
         st.markdown("### 📊 Distribution des Transactions")
         c1, c2 = st.columns([2, 1])
         with c1:
-            st.line_chart(df['Amount'].head(100))
+            spec = charts.get(chart_key('amount_line', data_version),
+                              lambda: series_chart_spec(df['Amount'].head(100), 'line', 'Transaction', 'Montant'),
+                              kind='json')
+            st.vega_lite_chart(spec, use_container_width=True)
             st.caption("Aperçu séquentiel des montants")
         with c2:
             st.markdown("""
@@ -170,54 +274,48 @@ elif menu == "Détection Temps Réel":
 
     with col_result:
         if submit and model is not None and scaler is not None:
-            # 1. PRETRAITEMENT
-            # Le scaler attend 2 colonnes : ['scaled_amount', 'scaled_time'] ou l'inverse selon votre notebook
-            # On suppose ici l'ordre Amount, Time. Il faut vérifier l'ordre du fit dans le notebook.
-            # Créons un array pour scaler
-            to_scale = np.array([[amount_val, time_val]])
-            scaled_vals = scaler.transform(to_scale)
-            
-            s_amount = scaled_vals[0][0]
-            s_time = scaled_vals[0][1]
-
-            # 2. CONSTRUCTION DU VECTEUR COMPLET (30 colonnes)
-            # L'ordre doit être EXACTEMENT celui de X_train dans le notebook.
-            # Généralement : Time, V1...V28, Amount (mais parfois déplacé)
-            # Dans votre notebook (Capture 4.1), vous avez : 
-            # scaled_amount, scaled_time, V1, V2 ... V28
-            
-            # Initialisation d'un vecteur de 0 pour les 30 features
-            features = np.zeros((1, 30))
-            
-            # Remplissage intelligent
-            # On suppose l'ordre standard du dataset transformé :
-            # [scaled_amount, scaled_time, V1, V2, ..., V28] 
-            # (Vérifiez X_train.columns dans votre notebook pour être sûr à 100%)
-            
-            features[0, 0] = s_amount
-            features[0, 1] = s_time
-            # On remplit les V que l'utilisateur a modifié
-            # V1 est à l'index 2, V2 à l'index 3... donc Vn à l'index n+1
-            features[0, 17+1] = v17 # V17
-            features[0, 14+1] = v14 # V14
-            features[0, 12+1] = v12 # V12
-            features[0, 4+1] = v4   # V4
-            features[0, 11+1] = v11 # V11
-
-            # 3. PRÉDICTION
-            prediction = model.predict(features)
-            proba = model.predict_proba(features)[0][1] # Proba de la classe 1 (Fraude)
+            # 1. PRETRAITEMENT ET CONSTRUCTION DU VECTEUR
+            # Valeurs brutes placées par leur nom selon le schéma sauvegardé (X_train_res.columns),
+            # Time/Amount normalisés avec les paramètres du scaler ; les variables non saisies restent à 0
+            fields = {'Time': time_val, 'Amount': amount_val,
+                      'V17': v17, 'V14': v14, 'V12': v12, 'V4': v4, 'V11': v11}
+            velocity_names = [c for c in feature_names if c in VELOCITY_FEATURES]
+            if velocity_names:
+                # Vélocité calculée sur les transactions analysées dans cette session, dans l'ordre de Time
+                velocity_state = st.session_state.setdefault('velocity_state', VelocityState())
+                try:
+                    values = velocity_state.update(time_val, amount_val)
+                except ValueError:
+                    # Temps antérieur à la transaction précédente : nouveau flux
+                    velocity_state = st.session_state['velocity_state'] = VelocityState()
+                    values = velocity_state.update(time_val, amount_val)
+                    st.caption("Temps antérieur à la transaction précédente : historique de vélocité réinitialisé.")
+                fields.update({name: value for name, value in zip(velocity_state.feature_names, values)
+                               if name in velocity_names})
+                st.caption(f"Vélocité : {velocity_state.end - 1} transaction(s) analysée(s) avant celle-ci dans cette session.")
+            with timer('feature_vector'):
+                features = load_pipeline(scaler, tuple(feature_names), model_version).from_fields(fields)
+
+            # 2. PRÉDICTION
+            # Un seul parcours de la forêt : la classe découle de la proba et du seuil
+            with timer('forest_inference'):
+                prediction, proba = predict_with_threshold(scoring_model, features, threshold)
+            proba = proba[0] # Proba de la classe 1 (Fraude)
 
             st.markdown("#### Résultat du Modèle")
             
             if prediction[0] == 1:
+                # Vraies features explicatives : contributions lues sur les chemins de la forêt
+                explainer = explainer_for(fast_model, model_version)
+                drivers = explainer.top_drivers(explainer.explain_row(features), k=2)[0]
+                motif = ", ".join(f"{name} ({contrib:+.1%})" for name, contrib in drivers)
                 st.markdown(f"""
                 <div style="background-color: #fadbd8; padding: 20px; border-radius: 8px; border: 2px solid #e74c3c; text-align: center;">
                     <h2 style="color: #c0392b !important;">🚨 FRAUDE DÉTECTÉE</h2>
                     <h1 style="color: #c0392b !important; font-size: 45px;">{proba:.1%}</h1>
                     <p style="color: #c0392b !important;">Probabilité de risque</p>
                     <hr>
-                    <p style="color: #c0392b !important; font-size: 14px;">Motif principal : V17={v17}, V14={v14}</p>
+                    <p style="color: #c0392b !important; font-size: 14px;">Motif principal : {motif}</p>
                 </div>
                 """, unsafe_allow_html=True)
             else:
@@ -231,16 +329,138 @@ elif menu == "Détection Temps Réel":
         elif submit:
              st.error("Le modèle n'est pas chargé.")
 
+    # --- ANALYSE PAR LOT ---
+    st.markdown("---")
+    st.markdown("#### 📂 Analyse par Lot")
+    st.markdown("Chargez un fichier CSV ou Parquet au format `creditcard.csv` pour scorer toutes les transactions.")
+
+    uploaded_file = st.file_uploader("Fichier de transactions", type=['csv', 'parquet'])
+    output_format = st.radio("Format du fichier de résultats", ['csv', 'parquet'], horizontal=True)
+
+    if uploaded_file is not None and st.button("SCORER LE FICHIER"):
+        if model is None or scaler is None:
+            st.error("Le modèle n'est pas chargé.")
+        else:
+            progress = st.empty()
+            output_path = os.path.join(tempfile.gettempdir(), f"resultats_scoring.{output_format}")
+            summary = score_file(
+                uploaded_file, output_path, scoring_model, scaler,
+                file_format=detect_format(uploaded_file.name),
+                threshold=threshold,
+                # Les transactions signalées reçoivent leurs principales features explicatives
+                explainer=explainer_for(fast_model, model_version),
+                progress_callback=lambda n: progress.text(f"{n:,} transactions scorées...")
+            )
+            progress.empty()
+            INSTRUMENTATION.record('batch_scoring', summary['seconds'], n_items=summary['rows'])
+
+            b1, b2, b3 = st.columns(3)
+            with b1: st.metric("Transactions Scorées", f"{summary['rows']:,}")
+            with b2: st.metric("Fraudes Détectées", f"{summary['frauds']:,}")
+            with b3: st.metric("Durée", f"{summary['seconds']:.1f} s")
+
+            with open(output_path, 'rb') as f:
+                st.download_button(
+                    "TÉLÉCHARGER LES RÉSULTATS", f,
+                    file_name=f"resultats_scoring.{output_format}",
+                    mime='text/csv' if output_format == 'csv' else 'application/octet-stream'
+                )
+
 elif menu == "Explorateur de Données":
     if df is not None:
         st.markdown("## 🔍 Données Brutes")
-        st.dataframe(df.head(100), use_container_width=True)
+        explorer = get_explorer()
+        if explorer is not None:
+            with st.expander("Filtres", expanded=True):
+                f1, f2, f3 = st.columns(3)
+                with f1:
+                    class_choice = st.selectbox("Classe", ["Toutes", "Normales (0)", "Fraudes (1)"])
+                    amount_min, amount_max = st.number_input("Montant min", value=0.0), st.number_input("Montant max", value=0.0)
+                with f2:
+                    time_min, time_max = st.number_input("Temps min (s)", value=0.0), st.number_input("Temps max (s)", value=0.0)
+                    sort_by = st.selectbox("Trier par", ["Aucun", "Amount", "Time"])
+                with f3:
+                    feature = st.selectbox("Condition sur une feature", ["Aucune"] + [f'V{i}' for i in range(1, 29)])
+                    op = st.selectbox("Opérateur", list(CONDITION_OPERATORS))
+                    threshold_val = st.number_input("Valeur", value=-5.0)
+                descending = st.checkbox("Ordre décroissant")
+
+            # Un maximum à 0 = pas de filtre sur cette plage
+            ids = explorer.filter_ids(
+                classes=None if class_choice == "Toutes" else [int(class_choice[-2])],
+                amount_range=(amount_min, amount_max) if amount_max > 0 else None,
+                time_range=(time_min, time_max) if time_max > 0 else None,
+                conditions=[] if feature == "Aucune" else [(feature, op, threshold_val)],
+                sort_by=None if sort_by == "Aucun" else sort_by,
+                ascending=not descending
+            )
+            p1, p2 = st.columns([1, 3])
+            with p1:
+                page_size = st.selectbox("Lignes par page", [50, 100, 500])
+                n_pages = max(1, -(-len(ids) // page_size))
+                page = st.number_input("Page", min_value=1, max_value=n_pages, value=1) - 1
+            with p2:
+                st.metric("Transactions correspondantes", f"{len(ids):,}")
+                st.caption(f"Page {page + 1}/{n_pages} - {explorer.n_rows:,} transactions dans le dataset")
+            # Seule la page visible est matérialisée et envoyée au navigateur
+            st.dataframe(explorer.page(ids, page, page_size), use_container_width=True)
+        else:
+            st.dataframe(df.head(100), use_container_width=True)
         
         st.markdown("### Corrélations (Dataset Réel)")
-        fig, ax = plt.subplots(figsize=(10, 6))
+        # Statistiques sur tout le dataset, sans relecture des lignes (repli : l'échantillon chargé)
+        explorer_stats = stats or StreamingStats([c for c in df.columns if c != 'Class']).update(df)
         # On prend un sous-ensemble pour la lisibilité
         cols = ['Class', 'Amount', 'V17', 'V14', 'V12', 'V10', 'V11', 'V4']
-        sns.heatmap(df[cols].corr(), annot=True, cmap='coolwarm', ax=ax)
-        st.pyplot(fig)
+        heatmap = charts.get(chart_key('heatmap', stats_version, cols, 'coolwarm'),
+                             lambda: render_heatmap(explorer_stats.corr(cols), figsize=(10, 6), cmap='coolwarm'))
+        st.image(heatmap, use_container_width=True)
+
+        st.markdown("### Features les plus corrélées à la fraude")
+        spec = charts.get(chart_key('class_corr_bar', stats_version, 10),
+                          lambda: series_chart_spec(explorer_stats.class_correlation().head(10), 'bar',
+                                                    'Feature', 'Corrélation avec Class'),
+                          kind='json')
+        st.vega_lite_chart(spec, use_container_width=True)
+    else:
+        st.warning("Pas de données chargées.")
+
+elif menu == "Performance":
+    st.markdown("## ⏱️ Performance du Pipeline")
+    st.markdown("Latences mesurées dans ce processus depuis son démarrage (histogrammes par étape).")
+
+    def stages_table(stages):
+        table = pd.DataFrame(stages).T
+        columns = ['count', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'max_ms', 'throughput_per_s']
+        return table[columns].rename(columns={
+            'count': 'Appels', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)', 'p99_ms': 'p99 (ms)',
+            'mean_ms': 'Moyenne (ms)', 'max_ms': 'Max (ms)', 'throughput_per_s': 'Débit (éléments/s)'
+        })
+
+    stages = INSTRUMENTATION.snapshot()
+    if stages:
+        inference = stages.get('forest_inference')
+        m1, m2, m3 = st.columns(3)
+        with m1: st.metric("Inférence p50", f"{inference['p50_ms']:.2f} ms" if inference else "N/A")
+        with m2: st.metric("Inférence p99", f"{inference['p99_ms']:.2f} ms" if inference else "N/A")
+        with m3: st.metric("Rendu p95", f"{stages['rendering']['p95_ms']:.0f} ms" if 'rendering' in stages else "N/A")
+        st.dataframe(stages_table(stages), use_container_width=True)
+    else:
+        st.info("Aucune mesure pour l'instant.")
+
+    st.markdown("### Service de scoring")
+    service_stats = fetch_service_stats(os.environ.get('SCORING_SERVICE_URL', 'http://127.0.0.1:8000'))
+    if service_stats:
+        s1, s2, s3 = st.columns(3)
+        with s1: st.metric("Requêtes", f"{service_stats['total_requests']:,}")
+        with s2: st.metric("Latence p99", f"{service_stats['p99_ms']:.1f} ms" if service_stats['p99_ms'] is not None else "N/A")
+        with s3: st.metric("Taille moyenne des lots", f"{service_stats['mean_batch_size']:.1f}")
+        if service_stats.get('stages'):
+            st.dataframe(stages_table(service_stats['stages']), use_container_width=True)
     else:
-        st.warning("Pas de données chargées.")
\ No newline at end of file
+        st.caption("Service de scoring non joignable.")
+
+    if st.button("RÉINITIALISER LES MESURES"):
+        INSTRUMENTATION.reset()
+
+INSTRUMENTATION.record('rendering', time.perf_counter() - render_start)
\ No newline at end of file
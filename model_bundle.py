@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import joblib
+
+from fast_forest import FlatForest
+
+# --- BUNDLE DU MODÈLE ---
+# Dossier versionné :
+#   manifest.json     : schéma ordonné des features, paramètres du RobustScaler, seuil, métriques
+#   forest.joblib     : forêt aplatie (tableaux NumPy non compressés -> joblib.load(mmap_mode='r'))
+#   estimator.joblib  : RandomForestClassifier sklearn, chargé seulement si on en a besoin
+# Une forêt compressée (compression.py) garde le même format : seuls les types des tableaux changent.
+BUNDLE_FORMAT_VERSION = 1
+DEFAULT_BUNDLE_DIR = 'modele_fraude_bundle'
+
+MANIFEST_FILE = 'manifest.json'
+FOREST_FILE = 'forest.joblib'
+ESTIMATOR_FILE = 'estimator.joblib'
+
+
+class ScalerParams:
+    """ RobustScaler réduit à ses paramètres : (X - center) / scale, sans importer sklearn """
+
+    def __init__(self, center, scale, columns):
+        self.center_ = np.asarray(center, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.columns = list(columns)
+
+    @classmethod
+    def from_sklearn(cls, scaler, columns):
+        n = len(columns)
+        center = scaler.center_ if getattr(scaler, 'center_', None) is not None else np.zeros(n)
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n)
+        return cls(center, scale, columns)
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.center_
+        X /= self.scale_
+        return X
+
+
+class ModelBundle:
+    """ Bundle chargé : forêt en memory map + métadonnées ; l'estimateur sklearn est chargé à la demande """
+
+    def __init__(self, path, manifest, forest):
+        self.path = path
+        self.manifest = manifest
+        self.forest = forest
+        self._estimator = None
+
+    @property
+    def version(self):
+        return self.manifest['model_version']
+
+    @property
+    def feature_names(self):
+        return self.manifest['feature_names']
+
+    @property
+    def threshold(self):
+        return self.manifest['threshold']
+
+    @property
+    def metrics(self):
+        return self.manifest['metrics']
+
+    @property
+    def scaler(self):
+        params = self.manifest['scaler']
+        scaler = ScalerParams(params['center'], params['scale'], params['columns'])
+        scaler.scaler_type = params['type']
+        return scaler
+
+    @property
+    def estimator(self):
+        """ Import paresseux : sklearn n'est chargé que si on demande l'estimateur d'origine """
+        if self._estimator is None:
+            self._estimator = joblib.load(os.path.join(self.path, ESTIMATOR_FILE))
+        return self._estimator
+
+
+def save_bundle(model, scaler, feature_names, threshold=0.5, metrics=None,
+                path=DEFAULT_BUNDLE_DIR, scaled_columns=('Time', 'Amount'), threshold_details=None,
+                forest=None, compression=None):
+    """
+    Écrit le bundle du modèle (remplacement atomique du dossier existant).
+    `feature_names` doit être l'ordre exact des colonnes d'entraînement (X_train_res.columns).
+    `forest` : forêt aplatie déjà construite (ex. compressée) ; par défaut aplatie depuis `model`.
+    Lève ValueError si `feature_names` contient une colonne absente du format creditcard.csv.
+    """
+    from scoring import check_schema
+
+    # Un schéma que le scoring ne saurait pas remplir (ex. colonne 'Hour' d'exploration) n'est jamais publié
+    feature_names = check_schema(feature_names)
+    model_version = datetime.now().strftime("%Y%m%d_%H%M%S")
+    scaler_params = ScalerParams.from_sklearn(scaler, scaled_columns)
+
+    manifest = {
+        'bundle_format': BUNDLE_FORMAT_VERSION,
+        'model_version': model_version,
+        'model_type': type(model).__name__,
+        'n_estimators': len(model.estimators_),
+        'feature_names': feature_names,
+        'scaler': {
+            'type': getattr(scaler, 'scaler_type', type(scaler).__name__),
+            'columns': list(scaled_columns),
+            'center': scaler_params.center_.tolist(),
+            'scale': scaler_params.scale_.tolist()
+        },
+        'threshold': float(threshold),
+        'threshold_details': dict(threshold_details or {}),
+        'metrics': {k: float(v) for k, v in (metrics or {}).items()},
+        'compression': dict(compression or {})
+    }
+
+    tmp_path = f"{path}.tmp-{model_version}"
+    os.makedirs(tmp_path, exist_ok=True)
+
+    forest_arrays = (forest if forest is not None else FlatForest.from_sklearn(model)).to_arrays()
+    # Les noms de features vivent dans le manifeste : forest.joblib ne contient que des tableaux mappables
+    forest_arrays['feature_names'] = None
+    joblib.dump(forest_arrays, os.path.join(tmp_path, FOREST_FILE))
+    joblib.dump(model, os.path.join(tmp_path, ESTIMATOR_FILE))
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    # Remplacement du bundle précédent
+    old_path = f"{path}.old"
+    if os.path.exists(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return path
+
+
+def update_bundle_threshold(path, threshold, **details):
+    """
+    Réécrit le seuil du bundle sans ré-entraîner (ex. objectif de coût différent) :
+    seul le manifeste change, remplacé de façon atomique. `details` : objectif, métriques au seuil...
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['threshold'] = float(threshold)
+    manifest['threshold_details'] = details
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest_path
+
+
+def load_bundle(path=DEFAULT_BUNDLE_DIR, mmap_mode='r'):
+    """
+    Charge le bundle : les tableaux de la forêt sont mappés en mémoire (mmap_mode='r'),
+    donc plusieurs processus partagent une seule copie via le cache de pages de l'OS.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('bundle_format') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Format de bundle non supporté : {manifest.get('bundle_format')}")
+
+    # Schéma vérifié une fois au chargement : un bundle incompatible échoue ici, pas au premier bloc
+    from scoring import check_schema
+    check_schema(manifest['feature_names'], source=path)
+
+    arrays = joblib.load(os.path.join(path, FOREST_FILE), mmap_mode=mmap_mode)
+    arrays['feature_names'] = manifest['feature_names']
+    forest = FlatForest.from_arrays(arrays)
+    return ModelBundle(path, manifest, forest)
@@ -0,0 +1,108 @@
+import numpy as np
+
+from scoring import FEATURE_COLUMNS, SCALED_COLUMNS
+
+# --- PIPELINE DE FEATURES ---
+# Un seul composant pour l'application, le scoring par lot, le service et l'entraînement :
+# schéma ordonné des colonnes + centre/échelle du RobustScaler sous forme de tableaux.
+# Les lots sont des tableaux float32 (le type que lisent les arbres) remplis colonne par colonne,
+# sans DataFrame intermédiaire. Time/Amount sont normalisés en float64 puis arrondis une seule fois
+# en float32 : les arbres voient exactement les mêmes valeurs qu'avec scaler.transform en float64.
+BATCH_DTYPE = np.float32
+
+
+class FeaturePipeline:
+    """ Schéma des features + paramètres du RobustScaler ; remplit et normalise des lots float32 """
+
+    def __init__(self, feature_names, center, scale, scaled_columns=SCALED_COLUMNS):
+        self.feature_names = [str(c) for c in feature_names]
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+        missing = [c for c in scaled_columns if c not in self.index]
+        if missing:
+            raise ValueError(f"Colonnes normalisées absentes du schéma : {missing}")
+        self.scaled_columns = list(scaled_columns)
+        self.scaled_idx = np.array([self.index[c] for c in self.scaled_columns], dtype=np.intp)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, scaler, feature_names=FEATURE_COLUMNS, scaled_columns=SCALED_COLUMNS):
+        """ RobustScaler sklearn (notebook, scaler.joblib) ou ScalerParams du bundle """
+        # Ordre des colonnes du fit : ScalerParams.columns, ou les noms vus par sklearn
+        columns = getattr(scaler, 'columns', None)
+        if columns is None:
+            columns = getattr(scaler, 'feature_names_in_', scaled_columns)
+        n = len(columns)
+        center = getattr(scaler, 'center_', None)
+        scale = getattr(scaler, 'scale_', None)
+        return cls(feature_names,
+                   center if center is not None else np.zeros(n),
+                   scale if scale is not None else np.ones(n),
+                   list(columns))
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        scaler = bundle.scaler
+        return cls(bundle.feature_names, scaler.center_, scaler.scale_, scaler.columns)
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    def allocate(self, n_rows):
+        """ Lot float32 (n_rows, n_features) à réutiliser entre les blocs """
+        return np.empty((n_rows, self.n_features), dtype=BATCH_DTYPE)
+
+    def _out(self, n_rows, out):
+        if out is None:
+            return self.allocate(n_rows)
+        if out.dtype != BATCH_DTYPE or out.shape[1] != self.n_features or len(out) < n_rows:
+            raise ValueError(f"Lot incompatible : {out.shape} {out.dtype}, attendu (>= {n_rows}, {self.n_features}) float32")
+        return out[:n_rows]
+
+    def _scaled(self, values, k):
+        return (np.asarray(values, dtype=np.float64) - self.center[k]) / self.scale[k]
+
+    def transform_inplace(self, X):
+        """ Normalise en place les colonnes Time/Amount d'un lot déjà rempli avec les valeurs brutes """
+        X[:, self.scaled_idx] = (X[:, self.scaled_idx].astype(np.float64) - self.center) / self.scale
+        return X
+
+    def from_frame(self, df, out=None):
+        """ DataFrame (format creditcard.csv) -> lot normalisé ; colonnes lues une à une, sans copie du DataFrame """
+        missing = [c for c in self.feature_names if c not in df.columns]
+        if missing:
+            raise ValueError(f"Colonnes manquantes dans le fichier : {missing}")
+        X = self._out(len(df), out)
+        for j, name in enumerate(self.feature_names):
+            X[:, j] = df[name].to_numpy()
+        for k, j in enumerate(self.scaled_idx):
+            X[:, j] = self._scaled(df[self.scaled_columns[k]].to_numpy(), k)
+        return X
+
+    def from_rows(self, rows, out=None):
+        """ Lignes brutes déjà dans l'ordre du schéma (ex. vecteurs JSON du service) -> lot normalisé """
+        raw = np.asarray(rows, dtype=np.float64)
+        X = self._out(len(raw), out)
+        X[:] = raw
+        for k, j in enumerate(self.scaled_idx):
+            X[:, j] = self._scaled(raw[:, j], k)
+        return X
+
+    def from_fields(self, fields, default=0.0, out=None):
+        """ Une transaction {nom: valeur brute} -> lot (1, n_features) ; les champs absents valent `default` """
+        unknown = [name for name in fields if name not in self.index]
+        if unknown:
+            raise ValueError(f"Champs inconnus du schéma : {unknown}")
+        X = self._out(1, out)
+        X[0] = default
+        for name, value in fields.items():
+            X[0, self.index[name]] = value
+        for k, j in enumerate(self.scaled_idx):
+            X[0, j] = self._scaled(fields.get(self.scaled_columns[k], default), k)
+        return X
+
+    def transform_frame(self, df):
+        """ Entraînement : DataFrame normalisé (float32, ordre du schéma) construit sur un seul lot """
+        import pandas as pd
+        return pd.DataFrame(self.from_frame(df), columns=self.feature_names, index=df.index, copy=False)
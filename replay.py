@@ -0,0 +1,266 @@
+import argparse
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from scoring import DEFAULT_THRESHOLD, iter_transaction_chunks, score_chunk
+from velocity_features import VelocityState
+
+# --- REJEU DE TRANSACTIONS ---
+# Les transactions sont rejouées dans l'ordre de Time, à `speedup` fois la vitesse réelle,
+# et scorées par le vrai modèle. Les compteurs par fenêtre de temps vivent dans des buffers
+# circulaires de taille fixe et les alertes dans une deque bornée : la mémoire ne dépend
+# que de la taille des blocs et du nombre de fenêtres, jamais de la longueur du flux.
+DEFAULT_SPEEDUP = 60
+DEFAULT_WINDOW_S = 60
+DEFAULT_N_WINDOWS = 60
+DEFAULT_CHUNKSIZE = 10_000
+# Au plus N transactions scorées par advance() : après une longue inactivité, une page ne rescore pas tout le fichier
+DEFAULT_MAX_ROWS_PER_ADVANCE = 50_000
+
+WINDOW_COUNTERS = ['transactions', 'flagged', 'blocked_amount', 'actual_frauds']
+
+
+class WindowedCounters:
+    """ Compteurs des `n_windows` dernières fenêtres de `window_s` secondes (buffers circulaires) """
+
+    def __init__(self, window_s=DEFAULT_WINDOW_S, n_windows=DEFAULT_N_WINDOWS):
+        self.window_s = window_s
+        self.n_windows = n_windows
+        self.window_ids = np.full(n_windows, -1, dtype=np.int64)
+        self.counters = {name: np.zeros(n_windows) for name in WINDOW_COUNTERS}
+        self.last_window = -1
+
+    def add(self, times, flagged, amounts, actual=None):
+        """ Ajoute un lot trié par Time : une agrégation par fenêtre touchée, pas par transaction """
+        windows = (np.asarray(times) // self.window_s).astype(np.int64)
+        values = {
+            'transactions': np.ones(len(windows)),
+            'flagged': flagged.astype(np.float64),
+            'blocked_amount': np.where(flagged, amounts, 0.0),
+            'actual_frauds': actual.astype(np.float64) if actual is not None else np.zeros(len(windows))
+        }
+        unique, starts = np.unique(windows, return_index=True)
+        for name, array in values.items():
+            values[name] = np.add.reduceat(array, starts) if len(array) else array
+        for i, window in enumerate(unique):
+            slot = window % self.n_windows
+            if self.window_ids[slot] != window:
+                # Fenêtre recyclée : on efface l'ancienne valeur
+                self.window_ids[slot] = window
+                for name in WINDOW_COUNTERS:
+                    self.counters[name][slot] = 0.0
+            for name in WINDOW_COUNTERS:
+                self.counters[name][slot] += values[name][i]
+        if len(unique):
+            self.last_window = max(self.last_window, int(unique[-1]))
+
+    def frame(self):
+        """ Fenêtres encore couvertes par le buffer, de la plus ancienne à la plus récente """
+        if self.last_window < 0:
+            return pd.DataFrame(columns=['window_start'] + WINDOW_COUNTERS)
+        expected = np.arange(self.last_window - self.n_windows + 1, self.last_window + 1)
+        expected = expected[expected >= 0]
+        slots = expected % self.n_windows
+        valid = self.window_ids[slots] == expected
+        data = {'window_start': expected * self.window_s}
+        for name in WINDOW_COUNTERS:
+            data[name] = np.where(valid, self.counters[name][slots], 0.0)
+        return pd.DataFrame(data)
+
+
+class TransactionReplay:
+    """
+    Rejoue un flux de blocs de transactions (format creditcard.csv) au rythme du temps simulé.
+    advance() traite ce qui est « arrivé » depuis le dernier appel (au plus `max_rows_per_advance`) :
+    pas de thread, chaque rerun Streamlit fait simplement avancer le rejeu.
+    Avec `restart` (fonction qui renvoie un nouvel itérateur de blocs), la source est rejouée en boucle :
+    chaque passage reprend après le précédent sur l'axe du temps affiché.
+    """
+
+    def __init__(self, chunks, model, scaler, threshold=DEFAULT_THRESHOLD, speedup=DEFAULT_SPEEDUP,
+                 window_s=DEFAULT_WINDOW_S, n_windows=DEFAULT_N_WINDOWS, max_alerts=20,
+                 alert_threshold=None, restart=None, max_rows_per_advance=DEFAULT_MAX_ROWS_PER_ADVANCE):
+        self.chunks = iter(chunks)
+        self.restart = restart
+        self.max_rows_per_advance = max_rows_per_advance
+        self.model = model
+        self.scaler = scaler
+        self.threshold = threshold
+        self.speedup = speedup
+        self.alert_threshold = threshold if alert_threshold is None else alert_threshold
+        self.windows = WindowedCounters(window_s, n_windows)
+        # Features de vélocité du flux rejoué (utilisées si le modèle en dépend)
+        self.velocity_state = VelocityState()
+        self.alerts = deque(maxlen=max_alerts)
+        self.processed = 0
+        self.flagged = 0
+        self.blocked_amount = 0.0
+        self.finished = False
+        self.passes = 1
+        # Décalage de Time du passage courant (affichage seulement : le modèle voit le Time d'origine)
+        self._time_offset = 0.0
+        self._pass_rows = 0
+        self._pass_max_time = 0.0
+        self._last_time = None
+        self._pending = None
+        self._sim_start = None
+        self._wall_start = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, model, scaler, chunksize=DEFAULT_CHUNKSIZE, loop=False, **kwargs):
+        """ Rejeu d'un fichier CSV/Parquet (creditcard.csv est déjà trié par Time), en boucle si `loop` """
+        restart = (lambda: iter_transaction_chunks(path, chunksize)) if loop else None
+        return cls(iter_transaction_chunks(path, chunksize), model, scaler, restart=restart, **kwargs)
+
+    @classmethod
+    def from_synthetic(cls, model, scaler, chunksize=DEFAULT_CHUNKSIZE, random_state=42, **kwargs):
+        """ Flux synthétique infini, généré bloc par bloc à la demande """
+        from data_loader import MAX_TIME, N_TRANSACTIONS, generate_synthetic
+
+        # Même débit que le vrai dataset (N_TRANSACTIONS transactions sur MAX_TIME secondes)
+        span = chunksize / N_TRANSACTIONS * MAX_TIME
+
+        def chunks():
+            seeds = np.random.SeedSequence(random_state)
+            i = 0
+            while True:
+                yield generate_synthetic(chunksize, random_state=seeds.spawn(1)[0],
+                                         time_window=(i * span, (i + 1) * span))
+                i += 1
+        return cls(chunks(), model, scaler, **kwargs)
+
+    @property
+    def sim_time(self):
+        """ Temps simulé courant (secondes du flux) """
+        if self._sim_start is None:
+            return None
+        return self._sim_start + (time.monotonic() - self._wall_start) * self.speedup
+
+    def _next_chunk(self):
+        for chunk in self.chunks:
+            if len(chunk):
+                if not chunk['Time'].is_monotonic_increasing:
+                    chunk = chunk.sort_values('Time', kind='stable')
+                scored = score_chunk(chunk, self.model, self.scaler, self.threshold,
+                                     velocity_state=self.velocity_state).reset_index(drop=True)
+                self._pass_rows += len(scored)
+                self._pass_max_time = max(self._pass_max_time, float(scored['Time'].iloc[-1]))
+                if self._time_offset:
+                    scored['Time'] = scored['Time'] + self._time_offset
+                return scored
+        if self.restart is not None and self._pass_rows:
+            # Source épuisée : nouveau passage, à la suite du précédent ; nouveau flux de vélocité
+            self.chunks = iter(self.restart())
+            self.velocity_state = VelocityState()
+            self._time_offset += self._pass_max_time + 1
+            self._pass_rows = 0
+            self._pass_max_time = 0.0
+            self.passes += 1
+            return self._next_chunk()
+        self.finished = True
+        return None
+
+    def advance(self, until=None):
+        """ Traite les transactions dont Time <= `until` (par défaut : le temps simulé courant) """
+        with self._lock:
+            if self._pending is None and not self.finished:
+                self._pending = self._next_chunk()
+            if self._pending is None:
+                return 0
+            if self._sim_start is None:
+                self._sim_start = float(self._pending['Time'].iloc[0])
+                self._wall_start = time.monotonic()
+            clock = until is None
+            until = self.sim_time if clock else until
+            limit = self.max_rows_per_advance
+
+            n_done = 0
+            while self._pending is not None:
+                times = self._pending['Time'].to_numpy()
+                cut = int(np.searchsorted(times, until, side='right'))
+                if limit is not None:
+                    cut = min(cut, limit - n_done)
+                if cut:
+                    self._consume(self._pending.iloc[:cut])
+                    n_done += cut
+                if cut < len(times):
+                    self._pending = self._pending.iloc[cut:]
+                    break
+                self._pending = self._next_chunk()
+            if clock and limit is not None and n_done >= limit and self._last_time is not None:
+                # Trop de retard (page inactive) : le temps simulé reprend à la dernière transaction traitée
+                self._sim_start = self._last_time
+                self._wall_start = time.monotonic()
+            return n_done
+
+    def _consume(self, scored):
+        flagged = scored['predicted_class'].to_numpy() == 1
+        amounts = scored['Amount'].to_numpy(dtype=np.float64)
+        actual = scored['Class'].to_numpy() == 1 if 'Class' in scored.columns else None
+        self.windows.add(scored['Time'].to_numpy(), flagged, amounts, actual)
+        self._last_time = float(scored['Time'].iloc[-1])
+
+        self.processed += len(scored)
+        self.flagged += int(flagged.sum())
+        self.blocked_amount += float(amounts[flagged].sum())
+
+        high_risk = scored[scored['fraud_probability'] >= self.alert_threshold]
+        # Seules les dernières alertes comptent : la deque est bornée
+        for row in high_risk.tail(self.alerts.maxlen).itertuples(index=False):
+            self.alerts.append({'time': float(row.Time), 'amount': float(row.Amount),
+                                'probability': float(row.fraud_probability)})
+
+    def recent_alerts(self, n=5):
+        """ Alertes les plus récentes d'abord """
+        return list(self.alerts)[::-1][:n]
+
+    def summary(self):
+        return {
+            'processed': self.processed,
+            'flagged': self.flagged,
+            'blocked_amount': self.blocked_amount,
+            'sim_time': self.sim_time,
+            'passes': self.passes,
+            'finished': self.finished and self._pending is None
+        }
+
+
+def format_sim_time(seconds):
+    """ Secondes du flux -> 'J1 13:45' """
+    seconds = int(seconds)
+    return f"J{seconds // 86400 + 1} {seconds % 86400 // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+def main(argv=None):
+    from scoring_service import load_scoring_resources
+
+    parser = argparse.ArgumentParser(description="Rejoue un flux de transactions à travers le modèle")
+    parser.add_argument('source', nargs='?', default='creditcard.csv', help="CSV/Parquet trié par Time, ou 'synthetic'")
+    parser.add_argument('--speedup', type=float, default=DEFAULT_SPEEDUP)
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW_S, help="Taille d'une fenêtre (secondes)")
+    parser.add_argument('--duration', type=float, default=30, help="Durée du rejeu (secondes réelles)")
+    parser.add_argument('--interval', type=float, default=2, help="Intervalle d'affichage (secondes)")
+    parser.add_argument('--loop', action='store_true', help="Rejoue le fichier en boucle")
+    args = parser.parse_args(argv)
+
+    model, scaler, threshold = load_scoring_resources()
+    kwargs = dict(threshold=threshold, speedup=args.speedup, window_s=args.window)
+    replay = (TransactionReplay.from_synthetic(model, scaler, **kwargs) if args.source == 'synthetic'
+              else TransactionReplay.from_file(args.source, model, scaler, loop=args.loop, **kwargs))
+
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline and not replay.summary()['finished']:
+        replay.advance()
+        s = replay.summary()
+        print(f"[{format_sim_time(s['sim_time'])}] {s['processed']:,} transactions, "
+              f"{s['flagged']:,} signalées, {s['blocked_amount']:,.2f} € bloqués")
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CSV_DTYPES, DEFAULT_CHUNKSIZE, load_store, write_feather_chunks
+
+# --- RÉÉCHANTILLONNAGE HORS MÉMOIRE ---
+# Mêmes méthodes que apply_sampling dans les notebooks, mais le jeu d'entraînement est lu par blocs
+# et le résultat est écrit au fil de l'eau dans un store colonnaire (une partition Feather par méthode).
+# undersampling / oversampling_smote : seules la classe minoritaire et les tableaux d'indices tiennent en mémoire.
+# smote_tomek n'est PAS à mémoire bornée : les liens de Tomek demandent un index de plus proches voisins
+# sur tout le jeu suréchantillonné, chargé en entier (refusé sauf bounded_memory=False).
+# Avec le même random_state, les lignes produites sont celles d'imblearn, dans le même ordre.
+RESAMPLING_METHODS = ['undersampling', 'oversampling_smote', 'smote_tomek']
+BOUNDED_MEMORY_METHODS = ['undersampling', 'oversampling_smote']
+DEFAULT_RESAMPLED_DIR = 'resampled_store'
+TARGET_COLUMN = 'Class'
+
+
+def _chunk_source(source, target=TARGET_COLUMN, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Retourne (colonnes des features, fabrique d'itérateurs de blocs (X, y)).
+    `source` : fichier Feather/CSV contenant la cible, ou tuple (X, y) déjà en mémoire.
+    La fabrique est rappelée à chaque passe : rien n'est gardé entre deux passes.
+    """
+    if isinstance(source, tuple):
+        X, y = source
+        X = X if isinstance(X, pd.DataFrame) else pd.DataFrame(X)
+        y = np.asarray(y)
+
+        def chunks():
+            for start in range(0, len(X), chunksize):
+                yield X.iloc[start:start + chunksize], y[start:start + chunksize]
+        return list(X.columns), chunks
+
+    if source.endswith('.csv'):
+        columns = [c for c in pd.read_csv(source, nrows=0).columns if c != target]
+
+        def chunks():
+            for chunk in pd.read_csv(source, chunksize=chunksize, dtype=CSV_DTYPES):
+                yield chunk[columns], chunk[target].to_numpy()
+        return columns, chunks
+
+    import pyarrow.feather as feather
+    table = feather.read_table(source, memory_map=True)
+    columns = [c for c in table.column_names if c != target]
+
+    def chunks():
+        for batch in table.to_batches(max_chunksize=chunksize):
+            chunk = batch.to_pandas(split_blocks=True)
+            yield chunk[columns], chunk[target].to_numpy()
+    return columns, chunks
+
+
+def _class_counts(chunks):
+    """ Première passe : effectifs par classe (seule la cible est lue) """
+    counts = {}
+    y_dtype = None
+    for _, y in chunks():
+        y_dtype = y.dtype
+        values, n = np.unique(y, return_counts=True)
+        for value, count in zip(values.tolist(), n.tolist()):
+            counts[value] = counts.get(value, 0) + count
+    return dict(sorted(counts.items())), y_dtype
+
+
+def _to_frame(X, y, columns, target):
+    df = pd.DataFrame(X, columns=columns)
+    df[target] = y
+    return df
+
+
+# --- SOUS-ÉCHANTILLONNAGE ---
+
+def _undersample_chunks(chunks, columns, counts, y_dtype, random_state, target, chunksize):
+    """
+    Équivalent de RandomUnderSampler : chaque classe non minoritaire est réduite à l'effectif
+    de la minorité. Les tirages sont ceux d'imblearn (même RandomState, même ordre des classes),
+    puis une seconde passe récupère les lignes retenues.
+    """
+    rng = np.random.RandomState(random_state)
+    n_min = min(counts.values())
+    minority = min(counts, key=counts.get)
+
+    # Position de sortie de chaque ligne, indexée par son rang dans sa classe (-1 = écartée)
+    out_pos, offset = {}, 0
+    for cls, count in counts.items():
+        if cls == minority:
+            selected = np.arange(count)
+        else:
+            selected = rng.choice(range(count), size=n_min, replace=False)
+        pos = np.full(count, -1, dtype=np.int64)
+        pos[selected] = offset + np.arange(len(selected))
+        out_pos[cls] = pos
+        offset += len(selected)
+
+    X_out, y_out = None, np.empty(offset, dtype=y_dtype)
+    seen = dict.fromkeys(counts, 0)
+    for X_chunk, y_chunk in chunks():
+        X_chunk = X_chunk.to_numpy()
+        if X_out is None:
+            X_out = np.empty((offset, X_chunk.shape[1]), dtype=X_chunk.dtype)
+        for cls in counts:
+            rows = np.flatnonzero(y_chunk == cls)
+            pos = out_pos[cls][seen[cls]:seen[cls] + len(rows)]
+            seen[cls] += len(rows)
+            keep = pos >= 0
+            X_out[pos[keep]] = X_chunk[rows[keep]]
+            y_out[pos[keep]] = cls
+
+    # Le résultat ne fait que n_classes * n_min lignes : il est écrit par blocs
+    for start in range(0, offset, chunksize):
+        yield _to_frame(X_out[start:start + chunksize], y_out[start:start + chunksize], columns, target)
+
+
+# --- SMOTE ---
+
+def _smote_chunks(chunks, columns, counts, y_dtype, random_state, target, chunksize, k_neighbors=5):
+    """
+    Équivalent de SMOTE : les lignes d'origine sont recopiées telles quelles,
+    puis n_majorité - n_minorité points synthétiques sont générés bloc par bloc.
+    L'index des voisins n'est construit que sur la classe minoritaire.
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    majority = max(counts, key=counts.get)
+    minority = min(counts, key=counts.get)
+    n_samples = counts[majority] - counts[minority]
+
+    # Passe 1 : recopie des lignes d'origine et collecte de la classe minoritaire
+    X_class = []
+    for X_chunk, y_chunk in chunks():
+        X_class.append(X_chunk.to_numpy()[y_chunk == minority])
+        yield _to_frame(X_chunk.to_numpy(), y_chunk, columns, target)
+    X_class = np.concatenate(X_class)
+    if n_samples == 0:
+        return
+
+    nn = NearestNeighbors(n_neighbors=k_neighbors + 1).fit(X_class)
+    nns = nn.kneighbors(X_class, return_distance=False)[:, 1:]
+
+    # imblearn tire d'abord tous les indices (randint) puis tous les pas (uniform) avec le même
+    # RandomState : un second générateur est avancé d'autant pour produire les pas par blocs
+    rng_indices = np.random.RandomState(random_state)
+    rng_steps = np.random.RandomState(random_state)
+    for start in range(0, n_samples, chunksize):
+        rng_steps.randint(low=0, high=nns.size, size=min(chunksize, n_samples - start))
+
+    for start in range(0, n_samples, chunksize):
+        size = min(chunksize, n_samples - start)
+        samples_indices = rng_indices.randint(low=0, high=nns.size, size=size)
+        steps = rng_steps.uniform(size=size)[:, np.newaxis]
+        rows = np.floor_divide(samples_indices, nns.shape[1])
+        cols = np.mod(samples_indices, nns.shape[1])
+        diffs = X_class[nns[rows, cols]] - X_class[rows]
+        X_new = (X_class[rows] + steps * diffs).astype(X_class.dtype)
+        yield _to_frame(X_new, np.full(size, minority, dtype=y_dtype), columns, target)
+
+
+# --- TOMEK LINKS ---
+
+def _tomek_chunks(path, columns, target, chunksize):
+    """
+    Équivalent de TomekLinks(sampling_strategy='all') sur le résultat de SMOTE :
+    les deux points de chaque paire de plus proches voisins mutuels de classes différentes sont retirés.
+    L'index porte sur tout le jeu suréchantillonné, matérialisé en mémoire (X complet) ;
+    seules les requêtes sont faites par blocs.
+    """
+    import pyarrow.feather as feather
+    from sklearn.neighbors import NearestNeighbors
+
+    table = feather.read_table(path, memory_map=True)
+    X = table.select(columns).to_pandas(split_blocks=True).to_numpy()
+    y = table.column(target).to_numpy()
+
+    nn = NearestNeighbors(n_neighbors=2).fit(X)
+    nn_index = np.empty(len(y), dtype=np.int64)
+    for start in range(0, len(y), chunksize):
+        nn_index[start:start + chunksize] = nn.kneighbors(
+            X[start:start + chunksize], return_distance=False)[:, 1]
+
+    links = (y[nn_index] != y) & (nn_index[nn_index] == np.arange(len(y)))
+    keep = np.flatnonzero(~links)
+    del X
+
+    for start in range(0, len(keep), chunksize):
+        yield table.take(keep[start:start + chunksize]).to_pandas(split_blocks=True)
+
+
+def resample_out_of_core(source, method='undersampling', store_dir=DEFAULT_RESAMPLED_DIR,
+                         random_state=42, target=TARGET_COLUMN, chunksize=DEFAULT_CHUNKSIZE,
+                         bounded_memory=True):
+    """
+    Rééchantillonne un jeu d'entraînement sans le charger en entier
+    et écrit le résultat dans `store_dir/<method>/` (partition Feather relisible avec load_store).
+    `source` : fichier Feather/CSV avec la colonne cible, ou tuple (X_train, y_train).
+    `bounded_memory` : refuse smote_tomek, qui charge tout le jeu suréchantillonné en mémoire.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f"Méthode inconnue : {method} (choix : {RESAMPLING_METHODS})")
+    if bounded_memory and method not in BOUNDED_MEMORY_METHODS:
+        raise ValueError(f"{method} n'est pas à mémoire bornée (index de voisins sur tout le jeu suréchantillonné) : "
+                         f"choisir parmi {BOUNDED_MEMORY_METHODS} ou passer bounded_memory=False")
+    start_time = time.time()
+
+    columns, chunks = _chunk_source(source, target, chunksize)
+    counts, y_dtype = _class_counts(chunks)
+
+    out_dir = os.path.join(store_dir, method)
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, 'part-00000.feather')
+
+    if method == 'undersampling':
+        frames = _undersample_chunks(chunks, columns, counts, y_dtype, random_state, target, chunksize)
+        n_rows = write_feather_chunks(frames, out_path)
+    else:
+        frames = _smote_chunks(chunks, columns, counts, y_dtype, random_state, target, chunksize)
+        n_rows = write_feather_chunks(frames, out_path)
+        if method == 'smote_tomek':
+            smote_path = out_path + '.smote'
+            os.replace(out_path, smote_path)
+            n_rows = write_feather_chunks(_tomek_chunks(smote_path, columns, target, chunksize), out_path)
+            os.remove(smote_path)
+
+    return {
+        'method': method,
+        'rows_in': sum(counts.values()),
+        'rows_out': n_rows,
+        'store_dir': out_dir,
+        'seconds': time.time() - start_time
+    }
+
+
+def load_resampled(method='undersampling', store_dir=DEFAULT_RESAMPLED_DIR, target=TARGET_COLUMN):
+    """ Relit le résultat en memory map : retourne (X_res, y_res) comme fit_resample """
+    df = load_store(os.path.join(store_dir, method))
+    return df.drop(columns=[target]), df[target]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rééchantillonnage hors mémoire d'un jeu d'entraînement")
+    parser.add_argument('source', help="Fichier Feather ou CSV d'entraînement (features + Class)")
+    parser.add_argument('--method', choices=RESAMPLING_METHODS, default='undersampling')
+    parser.add_argument('--store', default=DEFAULT_RESAMPLED_DIR)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--allow-full-load', action='store_true',
+                        help="Autorise smote_tomek, qui charge tout le jeu suréchantillonné en mémoire")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = resample_out_of_core(args.source, method=args.method, store_dir=args.store,
+                                       random_state=args.random_state, chunksize=args.chunksize,
+                                       bounded_memory=not args.allow_full_load)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"{summary['method']} : {summary['rows_in']:,} -> {summary['rows_out']:,} lignes "
+          f"en {summary['seconds']:.1f} s -> {summary['store_dir']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from compression import quantize_forest
+from data_loader import CSV_DTYPES, DEFAULT_STORE_DIR, append_to_store, load_store
+from fast_forest import FlatForest
+from model_bundle import DEFAULT_BUNDLE_DIR, load_bundle, save_bundle
+from preprocessing import FeaturePipeline
+from velocity_features import VELOCITY_FEATURES, add_velocity_features
+
+warnings.filterwarnings('ignore')
+
+RETRAIN_MODES = ['grow', 'replace_oldest']
+
+
+def undersample_majority(X, y, random_state=42):
+    """ Sous-échantillonnage aléatoire de la classe majoritaire (équivalent RandomUnderSampler) """
+    rng = np.random.default_rng(random_state)
+    classes, counts = np.unique(y, return_counts=True)
+    n_min = counts.min()
+    keep = np.concatenate([
+        rng.choice(np.flatnonzero(y == cls), size=n_min, replace=False) for cls in classes
+    ])
+    keep.sort()
+    return X[keep], y[keep]
+
+
+def prepare_features(df, bundle):
+    """ Transactions brutes -> lot float32 dans l'ordre du schéma du bundle (même pipeline que le scoring) """
+    if any(c in VELOCITY_FEATURES and c not in df.columns for c in bundle.feature_names):
+        # Vélocité calculée sur tout le lot dans l'ordre de Time, comme à l'entraînement
+        df = add_velocity_features(df.drop(columns=VELOCITY_FEATURES, errors='ignore'))
+    return FeaturePipeline.from_bundle(bundle).from_frame(df)
+
+
+def retrain_from_batch(new_batch, bundle_path=DEFAULT_BUNDLE_DIR, store_dir=DEFAULT_STORE_DIR,
+                       mode='grow', n_new_trees=20, max_trees=None, recent_parts=0,
+                       balance=True, random_state=42):
+    """
+    Réentraînement incrémental à partir d'un nouveau lot labellisé :
+    1. le lot est ajouté au store colonnaire
+    2. des arbres supplémentaires sont entraînés (warm_start) sur ce lot
+       (+ les `recent_parts` partitions précédentes du store si demandé)
+    3. en mode 'replace_oldest' (ou au-delà de `max_trees`) les arbres les plus anciens sont retirés
+    4. le bundle est réexporté
+    Le coût ne dépend que des nouvelles données, pas de tout l'historique.
+    """
+    if mode not in RETRAIN_MODES:
+        raise ValueError(f"Mode inconnu : {mode} (choix : {RETRAIN_MODES})")
+    start_time = time.time()
+
+    append_to_store(new_batch, store_dir)
+    train_df = new_batch
+    if recent_parts:
+        # Nouveau lot + les `recent_parts` partitions qui le précèdent dans le store
+        train_df = load_store(store_dir, last_parts=recent_parts + 1)
+
+    bundle = load_bundle(bundle_path)
+    model = bundle.estimator
+
+    X = prepare_features(train_df, bundle)
+    y = train_df['Class'].to_numpy()
+    if len(np.unique(y)) < 2:
+        raise ValueError("Le lot doit contenir des transactions normales ET frauduleuses pour entraîner de nouveaux arbres")
+    if balance:
+        X, y = undersample_majority(X, y, random_state=random_state)
+    # On garde les noms de colonnes vus par le modèle à l'entraînement initial
+    X = pd.DataFrame(X, columns=bundle.feature_names)
+
+    n_before = len(model.estimators_)
+    if mode == 'replace_oldest':
+        model.estimators_ = model.estimators_[n_new_trees:]
+
+    # warm_start : sklearn n'entraîne que les arbres ajoutés, les anciens sont conservés
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_new_trees)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+
+    if max_trees is not None and len(model.estimators_) > max_trees:
+        model.estimators_ = model.estimators_[-max_trees:]
+        model.set_params(n_estimators=max_trees)
+
+    metrics = dict(bundle.metrics)
+    metrics.update({
+        'retrain_rows': float(len(train_df)),
+        'retrain_trees_added': float(n_new_trees),
+        'retrain_seconds': time.time() - start_time
+    })
+    # Bundle compressé (compression.py) : la nouvelle forêt est quantifiée avec le même encodage
+    compression = bundle.manifest.get('compression') or {}
+    forest = None
+    if compression:
+        forest = quantize_forest(FlatForest.from_sklearn(model), compression['value_encoding'])
+        # Les indices des arbres sélectionnés ne désignent plus rien après l'ajout d'arbres
+        compression = {**{k: v for k, v in compression.items() if k != 'kept_trees'},
+                       'retrained_from': bundle.version}
+    # Bundle réexporté avec le même scaler, le même schéma et le même seuil
+    save_bundle(model, bundle.scaler, bundle.feature_names, threshold=bundle.threshold,
+                metrics=metrics, path=bundle_path, scaled_columns=bundle.scaler.columns,
+                threshold_details=bundle.manifest.get('threshold_details'),
+                forest=forest, compression=compression)
+
+    return {
+        'mode': mode,
+        'trees_before': n_before,
+        'trees_after': len(model.estimators_),
+        'train_rows': len(train_df),
+        'seconds': time.time() - start_time
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Réentraînement incrémental du modèle à partir de nouveaux lots labellisés")
+    parser.add_argument('batches', nargs='+', help="Fichiers CSV de nouvelles transactions labellisées (avec Class)")
+    parser.add_argument('--bundle', default=DEFAULT_BUNDLE_DIR)
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--mode', choices=RETRAIN_MODES, default='grow')
+    parser.add_argument('--n-trees', type=int, default=20, help="Nombre d'arbres ajoutés par lot")
+    parser.add_argument('--max-trees', type=int, default=None, help="Taille maximale de la forêt (les plus anciens sont retirés)")
+    parser.add_argument('--recent-parts', type=int, default=0, help="Partitions récentes du store ajoutées au lot")
+    parser.add_argument('--no-balance', action='store_true', help="Ne pas sous-échantillonner la classe majoritaire")
+    args = parser.parse_args(argv)
+
+    for path in args.batches:
+        batch = pd.read_csv(path, dtype=CSV_DTYPES)
+        summary = retrain_from_batch(
+            batch, bundle_path=args.bundle, store_dir=args.store, mode=args.mode,
+            n_new_trees=args.n_trees, max_trees=args.max_trees,
+            recent_parts=args.recent_parts, balance=not args.no_balance
+        )
+        print(f"{path}: {summary['train_rows']:,} lignes, arbres {summary['trees_before']} -> "
+              f"{summary['trees_after']} en {summary['seconds']:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from fast_forest import FlatForest
+from velocity_features import VELOCITY_FEATURES, VelocityState
+
+# --- SCHÉMA DU DATASET ---
+# Ordre des colonnes de X dans le notebook : df.drop(columns=['Class', 'Hour'])
+FEATURE_COLUMNS = ['Time'] + [f'V{i}' for i in range(1, 29)] + ['Amount']
+# Colonnes normalisées par le RobustScaler (ordre du fit dans le notebook)
+SCALED_COLUMNS = ['Time', 'Amount']
+# Colonnes recopiées telles quelles dans le fichier de résultats
+PASSTHROUGH_COLUMNS = ['Time', 'Amount', 'Class']
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Seuil de décision par défaut (celui implicite de model.predict)
+DEFAULT_THRESHOLD = 0.5
+
+
+def check_schema(feature_names, source=None):
+    """
+    Refuse un schéma de modèle que le scoring ne sait pas remplir : chaque feature doit être
+    une colonne de creditcard.csv ou une feature de vélocité (dérivée de Time/Amount).
+    Appelé à l'enregistrement et au chargement du modèle, jamais bloc par bloc.
+    """
+    unknown = [str(c) for c in feature_names if c not in FEATURE_COLUMNS and c not in VELOCITY_FEATURES]
+    if unknown:
+        prefix = f"{source} : " if source else ""
+        raise ValueError(f"{prefix}Features absentes du format creditcard.csv et non dérivables : {unknown} "
+                         f"(colonnes ajoutées pour l'exploration à retirer de X avant l'entraînement ?)")
+    return [str(c) for c in feature_names]
+
+
+# --- SEUIL DE DÉCISION ---
+
+def threshold_path_for(model_path='modele_fraude.joblib'):
+    """ Le seuil est sauvegardé à côté du modèle : modele_fraude.joblib -> modele_fraude_seuil.json """
+    return os.path.splitext(model_path)[0] + '_seuil.json'
+
+
+def save_threshold(threshold, model_path='modele_fraude.joblib', **details):
+    """ Sauvegarde le seuil optimal (ex. find_optimal_threshold) à côté du modèle """
+    path = threshold_path_for(model_path)
+    with open(path, 'w') as f:
+        json.dump({'threshold': float(threshold), **details}, f, indent=4)
+    return path
+
+
+def load_threshold(model_path='modele_fraude.joblib'):
+    """ Seuil persisté à côté du modèle, ou 0.5 s'il n'a pas encore été calculé """
+    try:
+        with open(threshold_path_for(model_path)) as f:
+            return float(json.load(f)['threshold'])
+    except FileNotFoundError:
+        return DEFAULT_THRESHOLD
+
+
+def predict_with_threshold(model, X, threshold=DEFAULT_THRESHOLD):
+    """
+    Un seul parcours de la forêt : la classe est déduite de la probabilité de fraude.
+    Retourne (y_pred, y_pred_proba).
+    """
+    y_pred_proba = model.predict_proba(X)[:, 1]
+    y_pred = (y_pred_proba >= threshold).astype(int)
+    return y_pred, y_pred_proba
+
+
+def load_model_and_scaler(model_path='modele_fraude.joblib', scaler_path='scaler.joblib'):
+    """ Charge le modèle et le scaler exportés depuis le notebook (schéma vérifié une fois ici) """
+    model = joblib.load(model_path)
+    check_schema(_model_columns(model), source=model_path)
+    scaler = joblib.load(scaler_path)
+    return model, scaler
+
+
+def detect_format(path_or_name):
+    """ Déduit le format ('csv' ou 'parquet') à partir de l'extension """
+    name = str(getattr(path_or_name, 'name', path_or_name)).lower()
+    if name.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    return 'csv'
+
+
+def iter_transaction_chunks(source, chunksize=DEFAULT_CHUNKSIZE, file_format=None):
+    """
+    Lit un fichier de transactions (chemin ou objet fichier) par blocs de `chunksize` lignes
+    """
+    file_format = file_format or detect_format(source)
+
+    if file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow est nécessaire pour lire les fichiers Parquet (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            yield chunk
+
+
+def score_chunk(chunk, model, scaler, threshold=DEFAULT_THRESHOLD, explainer=None, out=None,
+                velocity_state=None):
+    """
+    Score un bloc de transactions au format creditcard.csv :
+    lot float32 rempli et normalisé par le pipeline de features (`out` : lot préalloué réutilisé)
+    puis un seul appel à predict_proba. `scaler` : scaler ou preprocessing.FeaturePipeline.
+    Avec un `explainer` (explanations.PathExplainer), les transactions signalées
+    reçoivent leurs principales features explicatives (colonne motif_principal).
+    Si le modèle utilise les features de vélocité, elles sont calculées à partir de `velocity_state`
+    (état du flux partagé entre les blocs successifs, triés par Time).
+    """
+    from preprocessing import FeaturePipeline
+
+    # L'ordre exact des colonnes est celui vu par le modèle à l'entraînement
+    pipeline = scaler if isinstance(scaler, FeaturePipeline) else FeaturePipeline.from_scaler(
+        scaler, _model_columns(model))
+    needed = [c for c in pipeline.feature_names if c in VELOCITY_FEATURES and c not in chunk.columns]
+    if needed:
+        state = velocity_state if velocity_state is not None else VelocityState()
+        velocity = state.update_batch(chunk['Time'], chunk['Amount'])
+        chunk = chunk.assign(**{name: velocity[:, i] for i, name in enumerate(state.feature_names) if name in needed})
+    X = pipeline.from_frame(chunk, out=out)
+    if not isinstance(model, FlatForest):
+        # Forêt sklearn : on garde les noms de colonnes (simple vue sur le lot, pas de copie)
+        X = pd.DataFrame(X, columns=pipeline.feature_names, copy=False)
+
+    y_pred, proba = predict_with_threshold(model, X, threshold)
+
+    results = chunk[[c for c in PASSTHROUGH_COLUMNS if c in chunk.columns]].copy()
+    results['fraud_probability'] = proba
+    results['predicted_class'] = y_pred.astype(np.int8)
+
+    if explainer is not None:
+        from explanations import format_drivers
+        motifs = np.full(len(results), '', dtype=object)
+        flagged = np.flatnonzero(y_pred == 1)
+        if len(flagged):
+            # Explications calculées uniquement pour les alertes, en un seul passage vectorisé
+            contrib = explainer.contributions(np.asarray(X)[flagged])
+            motifs[flagged] = [format_drivers(d) for d in explainer.top_drivers(contrib)]
+        results['motif_principal'] = motifs
+    return results
+
+
+def _model_columns(model):
+    names = getattr(model, 'feature_names_in_', None)
+    return list(names) if names is not None else FEATURE_COLUMNS
+
+
+def score_file(source, output_path, model, scaler, chunksize=DEFAULT_CHUNKSIZE,
+               file_format=None, progress_callback=None, threshold=DEFAULT_THRESHOLD, explainer=None):
+    """
+    Score un fichier complet bloc par bloc et écrit les résultats au fil de l'eau
+    (CSV ou Parquet selon l'extension de `output_path`).
+    Retourne un résumé (lignes, fraudes, durée).
+    """
+    output_format = detect_format(output_path)
+    writer = None
+    n_rows = 0
+    n_frauds = 0
+    start_time = time.time()
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    from preprocessing import FeaturePipeline
+
+    # Un seul lot float32 alloué pour tout le fichier, réutilisé d'un bloc à l'autre
+    pipeline = scaler if isinstance(scaler, FeaturePipeline) else FeaturePipeline.from_scaler(
+        scaler, _model_columns(model))
+    batch = pipeline.allocate(chunksize)
+    # Fenêtres glissantes continues d'un bloc à l'autre
+    velocity_state = VelocityState()
+
+    try:
+        for chunk in iter_transaction_chunks(source, chunksize=chunksize, file_format=file_format):
+            results = score_chunk(chunk, model, pipeline, threshold=threshold, explainer=explainer, out=batch,
+                                  velocity_state=velocity_state)
+
+            if output_format == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(results, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            else:
+                results.to_csv(output_path, mode='a', header=(n_rows == 0), index=False)
+
+            n_rows += len(results)
+            n_frauds += int(results['predicted_class'].sum())
+            if progress_callback is not None:
+                progress_callback(n_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return {
+        'rows': n_rows,
+        'frauds': n_frauds,
+        'seconds': time.time() - start_time,
+        'output_file': output_path
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score par lot un fichier de transactions (format creditcard.csv) sans Streamlit"
+    )
+    parser.add_argument('input', help="Fichier CSV ou Parquet à scorer")
+    parser.add_argument('output', help="Fichier de résultats (.csv ou .parquet)")
+    parser.add_argument('--model', default='modele_fraude.joblib')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--threshold', type=float, default=None,
+                        help="Seuil de décision (par défaut : celui sauvegardé à côté du modèle)")
+    parser.add_argument('--explain', action='store_true',
+                        help="Ajoute les principales features explicatives des transactions signalées")
+    args = parser.parse_args(argv)
+
+    model, scaler = load_model_and_scaler(args.model, args.scaler)
+    threshold = args.threshold if args.threshold is not None else load_threshold(args.model)
+    explainer = None
+    if args.explain:
+        from explanations import explainer_for
+        explainer = explainer_for(model, model_version=os.path.abspath(args.model))
+    summary = score_file(
+        args.input, args.output, model, scaler,
+        chunksize=args.chunksize, threshold=threshold, explainer=explainer,
+        progress_callback=lambda n: print(f"  {n:,} transactions scorées", end='\r')
+    )
+    print(f"\n{summary['rows']:,} transactions scorées en {summary['seconds']:.1f} s "
+          f"({summary['frauds']:,} fraudes détectées) -> {summary['output_file']}")
+
+
+if __name__ == '__main__':
+    main()
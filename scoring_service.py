@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import json
+import time
+import warnings
+from collections import deque
+
+import numpy as np
+
+from fast_forest import FlatForest
+from instrumentation import INSTRUMENTATION, LatencyHistogram
+from model_bundle import DEFAULT_BUNDLE_DIR, load_bundle
+from preprocessing import FeaturePipeline
+from scoring import FEATURE_COLUMNS, load_model_and_scaler, load_threshold
+from velocity_features import VELOCITY_FEATURES, VelocityState
+
+warnings.filterwarnings('ignore')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+
+
+class LatencyRecorder:
+    """ Latences de bout en bout des requêtes (histogramme HDR) et tailles des derniers lots """
+
+    def __init__(self, window=10000):
+        self.latencies = LatencyHistogram()
+        self.batch_sizes = deque(maxlen=window)
+        self.total_requests = 0
+        self.started_at = time.time()
+
+    def record(self, latency_ms):
+        self.latencies.record(latency_ms / 1000)
+        self.total_requests += 1
+
+    def record_batch(self, size):
+        self.batch_sizes.append(size)
+
+    def snapshot(self):
+        stats = {
+            'total_requests': self.total_requests,
+            'uptime_s': time.time() - self.started_at,
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0
+        }
+        for p in (50, 95, 99):
+            stats[f'p{p}_ms'] = self.latencies.percentile(p)
+        # Détail par étape (scaler, inférence) mesuré dans le processus du service
+        stats['stages'] = INSTRUMENTATION.snapshot()
+        return stats
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes concurrentes en micro-lots :
+    un lot part dès qu'il atteint `max_batch_size` ou après `max_wait_ms` d'attente,
+    et il est scoré en un seul appel vectorisé.
+    """
+
+    def __init__(self, model, scaler, threshold=0.5, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.model = model
+        self.scaler = scaler
+        self.threshold = threshold
+        self.columns = list(model.feature_names_in_ if model.feature_names_in_ is not None else FEATURE_COLUMNS)
+        self.pipeline = FeaturePipeline.from_scaler(scaler, self.columns)
+        # Lot float32 préalloué : les micro-lots sont scorés l'un après l'autre, on le réutilise
+        self.batch = self.pipeline.allocate(max_batch_size)
+        # Features de vélocité calculées à l'arrivée de chaque transaction (buffer circulaire, O(1))
+        self.velocity_columns = [c for c in self.columns if c in VELOCITY_FEATURES]
+        self.velocity = VelocityState() if self.velocity_columns else None
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.recorder = LatencyRecorder()
+
+    def _parse(self, transaction):
+        """ Champs présents convertis en float ; (champs, vélocité à calculer ?) """
+        computed = self.velocity is not None and not all(c in transaction for c in self.velocity_columns)
+        required = [c for c in self.columns if not (computed and c in self.velocity_columns)]
+        if computed:
+            required += [c for c in ['Time', 'Amount'] if c not in required]
+        missing = [c for c in required if c not in transaction]
+        if missing:
+            raise ValueError(f"Champs manquants : {missing}")
+        names = set(self.columns) | ({'Time', 'Amount'} if computed else set())
+        return {c: float(transaction[c]) for c in names if c in transaction}, computed
+
+    def to_vectors(self, transactions):
+        """
+        Transactions JSON -> vecteurs dans l'ordre exact des colonnes du modèle.
+        Tout le lot est validé avant de toucher au flux de vélocité : une requête rejetée ne le modifie pas.
+        """
+        parsed = [self._parse(t) for t in transactions]
+        if self.velocity is not None:
+            self.velocity.validate([fields['Time'] for fields, computed in parsed if computed])
+        vectors = []
+        for fields, computed in parsed:
+            if computed:
+                values = self.velocity.update(fields['Time'], fields['Amount'])
+                fields = {**dict(zip(self.velocity.feature_names, values.tolist())), **fields}
+            vectors.append([fields[c] for c in self.columns])
+        return vectors
+
+    def to_vector(self, transaction):
+        """ Transaction JSON -> vecteur dans l'ordre exact des colonnes du modèle """
+        return self.to_vectors([transaction])[0]
+
+    async def score(self, vectors):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for vector in vectors:
+            future = loop.create_future()
+            await self.queue.put((vector, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            rows = [vector for vector, _ in batch]
+            try:
+                # Le calcul tourne dans un thread pour ne pas bloquer la boucle asyncio
+                proba = await loop.run_in_executor(None, self._predict, rows)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.recorder.record_batch(len(batch))
+            for (_, future), p in zip(batch, proba):
+                if not future.done():
+                    future.set_result(float(p))
+
+    def _predict(self, rows):
+        with INSTRUMENTATION.timer('scaler_transform', n_items=len(rows)):
+            X = self.pipeline.from_rows(rows, out=self.batch)
+        with INSTRUMENTATION.timer('forest_inference', n_items=len(X)):
+            return self.model.predict_proba(X)[:, 1]
+
+
+# --- SERVEUR HTTP MINIMAL (asyncio, sans dépendance) ---
+
+def _http_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+    headers = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(headers.encode('ascii') + body)
+
+
+async def _handle_request(batcher, method, path, body):
+    if method == 'GET' and path == '/health':
+        return 200, {'status': 'ok'}
+    if method == 'GET' and path == '/stats':
+        return 200, batcher.recorder.snapshot()
+    if method == 'POST' and path == '/score':
+        start = time.perf_counter()
+        try:
+            payload = json.loads(body or b'null')
+            transactions = payload if isinstance(payload, list) else [payload]
+            with INSTRUMENTATION.timer('feature_vector', n_items=len(transactions)):
+                vectors = batcher.to_vectors(transactions)
+        except (ValueError, TypeError, AttributeError) as exc:
+            return 400, {'error': str(exc)}
+
+        probas = await batcher.score(vectors)
+        results = [
+            {'fraud_probability': p, 'predicted_class': int(p >= batcher.threshold)}
+            for p in probas
+        ]
+        batcher.recorder.record((time.perf_counter() - start) * 1000)
+        return 200, results if isinstance(payload, list) else results[0]
+    return 404, {'error': f"Route inconnue : {method} {path}"}
+
+
+async def _handle_connection(batcher, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode('latin-1').split()
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            body = await reader.readexactly(length) if length else b''
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+            try:
+                status, payload = await _handle_request(batcher, method, path, body)
+            except Exception as exc:
+                status, payload = 500, {'error': str(exc)}
+            _http_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+def load_scoring_resources(bundle_path=DEFAULT_BUNDLE_DIR, model_path='modele_fraude.joblib',
+                           scaler_path='scaler.joblib'):
+    """ Bundle versionné si présent (forêt en memory map), sinon modèle et scaler séparés """
+    import os
+    if bundle_path and os.path.isdir(bundle_path):
+        bundle = load_bundle(bundle_path)
+        return bundle.forest, bundle.scaler, bundle.threshold
+    model, scaler = load_model_and_scaler(model_path, scaler_path)
+    return FlatForest.from_sklearn(model), scaler, load_threshold(model_path)
+
+
+async def serve(model_path='modele_fraude.joblib', scaler_path='scaler.joblib', host=DEFAULT_HOST,
+                port=DEFAULT_PORT, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                bundle_path=DEFAULT_BUNDLE_DIR):
+    """ Charge le modèle et le scaler une seule fois, puis sert /score, /stats et /health """
+    model, scaler, threshold = load_scoring_resources(bundle_path, model_path, scaler_path)
+    batcher = MicroBatcher(model, scaler, threshold=threshold,
+                           max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(
+        lambda r, w: _handle_connection(batcher, r, w), host, port
+    )
+    print(f"🛡️ Service de scoring prêt sur http://{host}:{port} "
+          f"(lots <= {max_batch_size}, attente <= {max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+def fetch_service_stats(url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=0.5):
+    """ Interroge /stats du service ; retourne None s'il ne répond pas """
+    import urllib.request
+    try:
+        with urllib.request.urlopen(f"{url}/stats", timeout=timeout) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP de scoring avec micro-batching")
+    parser.add_argument('--bundle', default=DEFAULT_BUNDLE_DIR,
+                        help="Dossier du bundle (prioritaire sur --model/--scaler s'il existe)")
+    parser.add_argument('--model', default='modele_fraude.joblib')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+
+    asyncio.run(serve(args.model, args.scaler, args.host, args.port,
+                      args.max_batch_size, args.max_wait_ms, bundle_path=args.bundle))
+
+
+if __name__ == '__main__':
+    main()
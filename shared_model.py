@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from fast_forest import FlatForest
+from preprocessing import FeaturePipeline
+
+# --- SEGMENT PARTAGÉ MODÈLE + DONNÉES ---
+# Un processus « loader » publie une fois les tableaux de la forêt et l'échantillon du dashboard
+# en fichiers .npy dans un dossier versionné ; chaque réplique de l'application les ouvre en memory map
+# (lecture seule) : une seule copie en RAM, partagée via le cache de pages de l'OS, quel que soit
+# le nombre de processus. Le fichier CURRENT désigne la version active et il est remplacé de façon
+# atomique (os.replace) : une réplique voit soit l'ancienne version complète, soit la nouvelle.
+DEFAULT_SHARED_DIR = 'shared_store'
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+FOREST_ARRAYS = ['feature', 'threshold', 'left', 'right', 'children', 'value', 'roots', 'classes']
+# Versions conservées : les répliques qui n'ont pas encore basculé gardent l'ancienne
+DEFAULT_KEEP_VERSIONS = 2
+
+
+def _save_array(path, array):
+    with open(path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+
+
+def publish(forest, scaler, threshold, feature_names, sample, kpis, version, store_dir=DEFAULT_SHARED_DIR,
+            keep=DEFAULT_KEEP_VERSIONS):
+    """
+    Écrit une version complète dans un dossier temporaire, le renomme, puis bascule CURRENT.
+    Ne fait rien si `version` est déjà la version active. Retourne le chemin de la version.
+    """
+    version = str(version)
+    version_dir = os.path.join(store_dir, f"v-{version}")
+    if current_version(store_dir) == version and os.path.isdir(version_dir):
+        return version_dir
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, 'forest'))
+    os.makedirs(os.path.join(tmp_dir, 'data'))
+
+    # Paramètres du scaler résolus comme partout ailleurs (ScalerParams ou RobustScaler sklearn)
+    pipeline = FeaturePipeline.from_scaler(scaler, feature_names)
+    arrays = forest.to_arrays()
+    # left/right sont absents d'une forêt compressée (seul `children` sert au parcours)
+    forest_arrays = [name for name in FOREST_ARRAYS if arrays[name] is not None]
+    for name in forest_arrays:
+        _save_array(os.path.join(tmp_dir, 'forest', f"{name}.npy"), arrays[name])
+    # Une colonne par fichier : chaque réplique reconstruit le DataFrame sans copie
+    for column in sample.columns:
+        _save_array(os.path.join(tmp_dir, 'data', f"{column}.npy"), sample[column].to_numpy())
+    _save_array(os.path.join(tmp_dir, 'data', '_index.npy'), sample.index.to_numpy())
+
+    manifest = {
+        'version': version,
+        'published_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'max_depth': forest.max_depth,
+        'forest_arrays': forest_arrays,
+        'value_scale': forest.value_scale,
+        'feature_names': [str(c) for c in feature_names],
+        'threshold': float(threshold),
+        'scaler': {
+            'columns': pipeline.scaled_columns,
+            'center': pipeline.center.tolist(),
+            'scale': pipeline.scale.tolist()
+        },
+        'kpis': kpis,
+        'data_columns': list(sample.columns)
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+    with open(os.path.join(store_dir, CURRENT_FILE + '.tmp'), 'w') as f:
+        f.write(version)
+    os.replace(os.path.join(store_dir, CURRENT_FILE + '.tmp'), os.path.join(store_dir, CURRENT_FILE))
+    _prune(store_dir, keep)
+    return version_dir
+
+
+def _prune(store_dir, keep):
+    """ Supprime les versions les plus anciennes (sous Windows, une version encore mappée est ignorée) """
+    versions = sorted((d for d in os.listdir(store_dir) if d.startswith('v-') and '.tmp-' not in d),
+                      key=lambda d: os.path.getmtime(os.path.join(store_dir, d)))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def current_version(store_dir=DEFAULT_SHARED_DIR):
+    """ Version active (lecture d'un petit fichier : assez léger pour chaque rerun Streamlit) """
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class SharedSnapshot:
+    """ Version publiée, ouverte en memory map : forêt, scaler, seuil, schéma, échantillon et KPIs """
+
+    def __init__(self, version_dir):
+        from model_bundle import ScalerParams
+
+        with open(os.path.join(version_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+
+        def load(kind, name):
+            return np.load(os.path.join(version_dir, kind, f"{name}.npy"), mmap_mode='r')
+
+        arrays = {name: load('forest', name) for name in self.manifest.get('forest_arrays', FOREST_ARRAYS)}
+        arrays['max_depth'] = self.manifest['max_depth']
+        arrays['value_scale'] = self.manifest.get('value_scale')
+        arrays['feature_names'] = self.manifest['feature_names']
+        self.forest = FlatForest.from_arrays(arrays)
+
+        params = self.manifest['scaler']
+        self.scaler = ScalerParams(params['center'], params['scale'], params['columns'])
+        self.threshold = self.manifest['threshold']
+        self.feature_names = self.manifest['feature_names']
+        self.kpis = self.manifest['kpis']
+        columns = {c: load('data', c) for c in self.manifest['data_columns']}
+        # copy=False : chaque colonne reste une vue sur le fichier mappé
+        self.sample = pd.DataFrame(columns, index=pd.Index(load('data', '_index')), copy=False)
+
+
+def attach(store_dir=DEFAULT_SHARED_DIR, version=None):
+    """ Ouvre la version demandée (par défaut : la version active) ; None si rien n'est publié """
+    version = version or current_version(store_dir)
+    if version is None:
+        return None
+    return SharedSnapshot(os.path.join(store_dir, f"v-{version}"))
+
+
+# --- PROCESSUS LOADER ---
+
+def source_version(bundle_path='modele_fraude_bundle', csv_path='creditcard.csv'):
+    """
+    Version des sources sans rien charger : version du modèle + seuil + hash du dataset.
+    Le seuil en fait partie : un nouveau seuil (update_bundle_threshold) est republié.
+    """
+    from data_loader import columnar_cache_version
+    from scoring import load_threshold
+
+    manifest_path = os.path.join(bundle_path, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        model_version, threshold = manifest['model_version'], manifest['threshold']
+    else:
+        # Ancien format : date de modification du modèle exporté
+        model_version = time.strftime('%Y%m%d_%H%M%S', time.localtime(os.path.getmtime('modele_fraude.joblib')))
+        threshold = load_threshold('modele_fraude.joblib')
+    return f"{model_version}-{threshold:.6f}-{columnar_cache_version(csv_path)[:12]}"
+
+
+def load_sources(bundle_path='modele_fraude_bundle', csv_path='creditcard.csv', sample_size=10000):
+    """ (forêt, scaler, seuil, schéma, échantillon, KPIs) depuis le bundle (ou l'ancien format) et le cache colonnaire """
+    from data_loader import load_sample_and_kpis_columnar
+    from scoring import FEATURE_COLUMNS
+    from scoring_service import load_scoring_resources
+
+    model, scaler, threshold = load_scoring_resources(bundle_path)
+    forest = model if isinstance(model, FlatForest) else FlatForest.from_sklearn(model)
+    feature_names = list(forest.feature_names_in_) if forest.feature_names_in_ is not None else FEATURE_COLUMNS
+    sample, kpis = load_sample_and_kpis_columnar(csv_path, sample_size=sample_size, random_state=42)
+    return forest, scaler, threshold, feature_names, sample, kpis
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Publie le modèle et l'échantillon du dashboard en memory map pour toutes les répliques"
+    )
+    parser.add_argument('--bundle', default='modele_fraude_bundle')
+    parser.add_argument('--csv', default='creditcard.csv')
+    parser.add_argument('--store', default=DEFAULT_SHARED_DIR)
+    parser.add_argument('--watch', type=float, default=0,
+                        help="Vérifie toutes les N secondes si le modèle ou les données ont changé (0 : une fois)")
+    args = parser.parse_args(argv)
+
+    while True:
+        # Seule la version est recalculée à chaque tour ; le chargement n'a lieu qu'en cas de changement
+        version = source_version(args.bundle, args.csv)
+        if version != current_version(args.store):
+            path = publish(*load_sources(args.bundle, args.csv), version=version, store_dir=args.store)
+            print(f"Version {version} publiée -> {path}")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import (DEFAULT_CHUNKSIZE, DEFAULT_STORE_DIR, columnar_cache_version,
+                         ensure_columnar_cache, list_store_parts)
+
+# --- STATISTIQUES INCRÉMENTALES ---
+# Par classe : effectif, moyennes et matrice des co-moments centrés (fusion de Chan et al.).
+# Corrélations, classement par rapport à Class et moyennes/écarts-types par classe
+# se déduisent en O(features²), sans relire une seule transaction.
+STATS_FORMAT_VERSION = 1
+
+
+class _Moments:
+    """ Effectif, moyenne et co-moments centrés d'un groupe de lignes """
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros((n_features, n_features))
+
+    def merge(self, n, mean, m2):
+        """ Fusion stable de deux groupes (pas de soustraction de grandes sommes de carrés) """
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + np.outer(delta, delta) * (self.n * n / total)
+        self.mean += delta * (n / total)
+        self.n = total
+
+    def update(self, X):
+        if len(X):
+            mean = X.mean(axis=0)
+            centered = X - mean
+            self.merge(len(X), mean, centered.T @ centered)
+
+
+class StreamingStats:
+    """
+    Statistiques suffisantes du dataset, mises à jour lot par lot (update) et sérialisables en JSON.
+    `target` (Class) est traité à part : les moments sont tenus séparément pour chaque classe.
+    """
+
+    def __init__(self, columns, target='Class'):
+        self.columns = list(columns)
+        self.target = target
+        self.groups = {}
+        self.sources = []
+
+    # --- MISE À JOUR ---
+
+    def update(self, df):
+        """ Ajoute un lot de transactions (DataFrame avec les colonnes suivies et éventuellement la cible) """
+        X = df[self.columns].to_numpy(dtype=np.float64)
+        if self.target is not None and self.target in df.columns:
+            y = df[self.target].to_numpy()
+            for cls in np.unique(y):
+                self._group(int(cls)).update(X[y == cls])
+        else:
+            self._group(None).update(X)
+        return self
+
+    def _group(self, key):
+        if key not in self.groups:
+            self.groups[key] = _Moments(len(self.columns))
+        return self.groups[key]
+
+    @property
+    def n(self):
+        return sum(g.n for g in self.groups.values())
+
+    @property
+    def has_target(self):
+        return self.target is not None and any(k is not None for k in self.groups)
+
+    # --- REQUÊTES ---
+
+    def _pooled(self):
+        """ Moments de tout le dataset (+ la cible en dernière colonne si elle est connue) """
+        with_target = self.has_target
+        n_cols = len(self.columns) + int(with_target)
+        pooled = _Moments(n_cols)
+        for key, g in self.groups.items():
+            mean, m2 = g.mean, g.m2
+            if with_target:
+                # La cible est constante dans un groupe : moyenne = classe, co-moments nuls
+                mean = np.append(mean, key)
+                m2 = np.pad(m2, ((0, 1), (0, 1)))
+            pooled.merge(g.n, mean, m2)
+        labels = self.columns + ([self.target] if with_target else [])
+        return pooled, labels
+
+    def corr(self, columns=None):
+        """ Matrice de corrélation de Pearson (équivalent de df[columns].corr()) """
+        pooled, labels = self._pooled()
+        std = np.sqrt(np.diag(pooled.m2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = pooled.m2 / np.outer(std, std)
+        result = pd.DataFrame(np.clip(corr, -1.0, 1.0), index=labels, columns=labels)
+        return result if columns is None else result.loc[columns, columns]
+
+    def class_correlation(self):
+        """ Corrélation de chaque feature avec la cible, triée par valeur absolue décroissante """
+        corr = self.corr()[self.target].drop(self.target)
+        return corr.reindex(corr.abs().sort_values(ascending=False).index)
+
+    def class_summary(self):
+        """ Moyennes et écarts-types (ddof=1) de chaque feature par classe """
+        rows = {}
+        for key in sorted(self.groups, key=lambda k: (k is None, k)):
+            g = self.groups[key]
+            std = np.sqrt(np.diag(g.m2) / (g.n - 1)) if g.n > 1 else np.full(len(self.columns), np.nan)
+            rows[(key, 'mean')] = g.mean
+            rows[(key, 'std')] = std
+        return pd.DataFrame(rows, index=self.columns).T
+
+    # --- PERSISTANCE ---
+
+    def to_dict(self):
+        return {
+            'stats_format': STATS_FORMAT_VERSION,
+            'columns': self.columns,
+            'target': self.target,
+            'sources': self.sources,
+            'groups': [
+                {'key': key, 'n': g.n, 'mean': g.mean.tolist(), 'm2': g.m2.tolist()}
+                for key, g in self.groups.items()
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('stats_format') != STATS_FORMAT_VERSION:
+            raise ValueError(f"Format de statistiques non supporté : {data.get('stats_format')}")
+        stats = cls(data['columns'], data['target'])
+        stats.sources = list(data['sources'])
+        for group in data['groups']:
+            g = stats._group(group['key'])
+            g.n = group['n']
+            g.mean = np.asarray(group['mean'], dtype=np.float64)
+            g.m2 = np.asarray(group['m2'], dtype=np.float64)
+        return stats
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def _iter_dataset_chunks(csv_path, chunksize=DEFAULT_CHUNKSIZE):
+    """ Parcourt le dataset par blocs via le cache colonnaire (memory map) """
+    import pyarrow.feather as feather
+
+    table = feather.read_table(ensure_columnar_cache(csv_path), memory_map=True)
+    for batch in table.to_batches(max_chunksize=chunksize):
+        yield batch.to_pandas(split_blocks=True)
+
+
+def stats_path_for(csv_path):
+    """ creditcard.csv -> creditcard_stats.json """
+    base, _ = os.path.splitext(csv_path)
+    return f"{base}_stats.json"
+
+
+def load_or_build_stats(csv_path='creditcard.csv', store_dir=DEFAULT_STORE_DIR, stats_path=None,
+                        target='Class', chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Statistiques du dataset + des partitions du store.
+    Le CSV n'est parcouru qu'une fois par version (hash) ; ensuite seules les nouvelles
+    partitions du store sont intégrées, puis le fichier de statistiques est réécrit.
+    """
+    import pyarrow.feather as feather
+
+    stats_path = stats_path or stats_path_for(csv_path)
+    version = columnar_cache_version(csv_path)
+    stats = None
+    if os.path.exists(stats_path):
+        try:
+            stats = StreamingStats.load(stats_path)
+        except (ValueError, KeyError):
+            stats = None
+    if stats is None or not stats.sources or stats.sources[0] != f"csv:{version}":
+        stats = None
+        for chunk in _iter_dataset_chunks(csv_path, chunksize):
+            if stats is None:
+                stats = StreamingStats([c for c in chunk.columns if c != target], target)
+            stats.update(chunk)
+        stats.sources = [f"csv:{version}"]
+
+    new_parts = [p for p in list_store_parts(store_dir) if os.path.basename(p) not in stats.sources]
+    for part in new_parts:
+        stats.update(feather.read_table(part, memory_map=True).to_pandas(split_blocks=True))
+        stats.sources.append(os.path.basename(part))
+
+    stats.save(stats_path)
+    return stats
@@ -0,0 +1,212 @@
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import joblib
+
+# Données partagées par les processus de travail (memory map, une seule copie en RAM)
+_SHARED = {}
+
+
+def _init_worker(X_path, y_path):
+    _SHARED['X'] = joblib.load(X_path, mmap_mode='r')
+    _SHARED['y'] = joblib.load(y_path, mmap_mode='r')
+
+
+def _fit_and_score(estimator, params, train_idx, test_idx, scoring):
+    """ Entraîne un candidat sur un pli et retourne son score (exécuté dans un processus de travail) """
+    from sklearn.base import clone
+    from sklearn.metrics import get_scorer
+
+    X, y = _SHARED['X'], _SHARED['y']
+    model = clone(estimator).set_params(**params)
+    model.fit(X[train_idx], y[train_idx])
+    return float(get_scorer(scoring)(model, X[test_idx], y[test_idx]))
+
+
+def _data_fingerprint(X, y, search_id=''):
+    """ Identité d'une recherche : données + réglages qui changent les scores (cf. _search_id) """
+    h = hashlib.sha256()
+    h.update(search_id.encode())
+    h.update(str(X.shape).encode())
+    h.update(np.ascontiguousarray(y).tobytes())
+    h.update(np.ascontiguousarray(X[:100]).tobytes())
+    h.update(np.ascontiguousarray(X[-100:]).tobytes())
+    return h.hexdigest()[:16]
+
+
+class SuccessiveHalvingSearch:
+    """
+    Recherche d'hyperparamètres par divisions successives (successive halving).
+    Au tour 0 tous les candidats sont évalués avec peu d'arbres et un petit échantillon ;
+    à chaque tour on garde le meilleur 1/factor et on multiplie le budget
+    (n_estimators et taille d'échantillon) par `factor`.
+
+    Même interface que GridSearchCV pour le notebook : fit(), best_params_, best_score_, best_estimator_.
+    `n_estimators` n'est pas un hyperparamètre cherché mais le budget : le dernier tour utilise
+    le maximum de param_grid['n_estimators'], et c'est cette valeur que rapporte best_params_.
+    Les évaluations sont sauvegardées au fil de l'eau dans `checkpoint_path` :
+    une recherche interrompue reprend là où elle s'était arrêtée (même données, même
+    scoring, même validation croisée et même estimateur de base, sinon tout est réévalué).
+    """
+
+    def __init__(self, estimator, param_grid, cv=3, scoring='roc_auc', factor=3,
+                 min_samples=1000, min_estimators=10, n_jobs=-1, refit=True,
+                 checkpoint_path='tuning_checkpoint.jsonl', random_state=42, verbose=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.scoring = scoring
+        self.factor = factor
+        self.min_samples = min_samples
+        self.min_estimators = min_estimators
+        self.n_jobs = n_jobs
+        self.refit = refit
+        self.checkpoint_path = checkpoint_path
+        self.random_state = random_state
+        self.verbose = verbose
+
+    # --- BUDGET PAR TOUR ---
+
+    def _candidates(self):
+        grid = {k: v for k, v in self.param_grid.items() if k != 'n_estimators'}
+        keys = sorted(grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+    def _schedule(self, n_candidates, n_samples):
+        """ Liste des tours : (nombre de candidats, taille d'échantillon, n_estimators) """
+        max_estimators = max(self.param_grid.get('n_estimators', [self.estimator.get_params()['n_estimators']]))
+        # Assez de tours pour qu'il reste au plus `factor` candidats au dernier
+        n_rounds = 1
+        while n_candidates > self.factor ** n_rounds:
+            n_rounds += 1
+        schedule = []
+        for r in range(n_rounds):
+            shrink = self.factor ** (n_rounds - 1 - r)
+            schedule.append((
+                max(1, int(np.ceil(n_candidates / self.factor ** r))),
+                min(n_samples, max(self.min_samples, n_samples // shrink)),
+                max(self.min_estimators, max_estimators // shrink)
+            ))
+        return schedule
+
+    def _search_id(self):
+        """ Réglages qui changent les scores : un checkpoint d'une autre configuration est ignoré """
+        params = sorted(self.estimator.get_params().items())
+        return repr((self.scoring, repr(self.cv), self.random_state, type(self.estimator).__name__, params))
+
+    def _load_checkpoint(self, fingerprint):
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get('data') == fingerprint:
+                        done[record['key']] = record['score']
+        return done
+
+    def _cv_splits(self, y_round):
+        from sklearn.model_selection import StratifiedKFold
+        cv = self.cv
+        if isinstance(cv, int):
+            cv = StratifiedKFold(n_splits=cv, shuffle=True, random_state=self.random_state)
+        return list(cv.split(np.zeros(len(y_round)), y_round))
+
+    # --- RECHERCHE ---
+
+    def fit(self, X, y):
+        start_time = time.time()
+        self.feature_names_in_ = list(X.columns) if hasattr(X, 'columns') else None
+        X_arr = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        y_arr = np.ascontiguousarray(np.asarray(y))
+
+        fingerprint = _data_fingerprint(X_arr, y_arr, self._search_id())
+        done = self._load_checkpoint(fingerprint)
+        rng = np.random.default_rng(self.random_state)
+
+        candidates = self._candidates()
+        schedule = self._schedule(len(candidates), len(y_arr))
+        n_workers = os.cpu_count() if self.n_jobs in (-1, None) else self.n_jobs
+        self.cv_results_ = []
+
+        # Les plis sont partagés avec les processus via des fichiers memory-mappés
+        workdir = tempfile.mkdtemp(prefix='tuning_')
+        try:
+            X_path, y_path = os.path.join(workdir, 'X.joblib'), os.path.join(workdir, 'y.joblib')
+            joblib.dump(X_arr, X_path)
+            joblib.dump(y_arr, y_path)
+
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(X_path, y_path)) as pool, \
+                    open(self.checkpoint_path, 'a') if self.checkpoint_path else open(os.devnull, 'w') as ckpt:
+                for round_idx, (n_keep, n_samples, n_estimators) in enumerate(schedule):
+                    candidates = candidates[:n_keep]
+
+                    # Sous-échantillon stratifié commun à tous les candidats du tour
+                    sample_idx = self._stratified_subsample(y_arr, n_samples, rng)
+                    splits = self._cv_splits(y_arr[sample_idx])
+
+                    if self.verbose:
+                        print(f"Tour {round_idx + 1}/{len(schedule)} : {len(candidates)} candidats, "
+                              f"{len(sample_idx):,} lignes, {n_estimators} arbres, "
+                              f"{len(candidates) * len(splits)} entraînements")
+
+                    scores = {i: [None] * len(splits) for i in range(len(candidates))}
+                    futures = {}
+                    for i, params in enumerate(candidates):
+                        for fold, (train, test) in enumerate(splits):
+                            key = json.dumps([round_idx, n_samples, n_estimators, params, fold],
+                                             sort_keys=True, default=str)
+                            if key in done:
+                                scores[i][fold] = done[key]
+                                continue
+                            task_params = {**params, 'n_estimators': n_estimators, 'n_jobs': 1}
+                            future = pool.submit(_fit_and_score, self.estimator, task_params,
+                                                 sample_idx[train], sample_idx[test], self.scoring)
+                            futures[future] = (i, fold, key)
+
+                    for future in as_completed(futures):
+                        i, fold, key = futures[future]
+                        score = future.result()
+                        scores[i][fold] = score
+                        ckpt.write(json.dumps({'data': fingerprint, 'key': key, 'score': score}) + "\n")
+                        ckpt.flush()
+
+                    mean_scores = [float(np.mean(scores[i])) for i in range(len(candidates))]
+                    for i, params in enumerate(candidates):
+                        self.cv_results_.append({
+                            'round': round_idx, 'n_samples': n_samples, 'n_estimators': n_estimators,
+                            'params': params, 'mean_test_score': mean_scores[i],
+                            'std_test_score': float(np.std(scores[i]))
+                        })
+
+                    # On garde les meilleurs pour le tour suivant (ordre stable en cas d'égalité)
+                    order = np.argsort(-np.asarray(mean_scores), kind='stable')
+                    candidates = [candidates[i] for i in order]
+                    self.best_score_ = mean_scores[order[0]]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.best_params_ = {**candidates[0], 'n_estimators': schedule[-1][2]}
+        if self.refit:
+            from sklearn.base import clone
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+            self.best_estimator_.fit(X, y)
+        self.wall_time_ = time.time() - start_time
+        return self
+
+    def _stratified_subsample(self, y, n_samples, rng):
+        if n_samples >= len(y):
+            return np.arange(len(y))
+        idx = []
+        for cls in np.unique(y):
+            cls_idx = np.flatnonzero(y == cls)
+            n_cls = max(1, int(round(n_samples * len(cls_idx) / len(y))))
+            idx.append(rng.choice(cls_idx, size=min(n_cls, len(cls_idx)), replace=False))
+        return np.sort(np.concatenate(idx))
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+# --- FEATURES DE VÉLOCITÉ ---
+# Agrégats glissants sur Time (le dataset n'a pas d'identifiant de carte : le flux est global).
+# Pour chaque transaction, sur les transactions *précédentes* du flux dont Time > t - fenêtre :
+#   tx_count_<w>s     : nombre de transactions
+#   amount_sum_<w>s   : somme des montants
+#   amount_zscore_<w>s: écart du montant courant à la moyenne de la fenêtre, en écarts-types
+# et seconds_since_prev : temps écoulé depuis la transaction précédente.
+# Deux implémentations aux valeurs identiques : vectorisée (tri + sommes cumulées) pour l'entraînement,
+# buffer circulaire O(1) par événement pour le scoring en flux. Les montants sont sommés en centimes
+# entiers (sommes exactes, indépendantes de l'ordre des opérations) et les formules en flottant
+# passent par la même fonction NumPy dans les deux cas.
+VELOCITY_WINDOWS = (60, 600, 3600)
+# Pas de transaction précédente
+NO_PREVIOUS = -1.0
+
+
+def velocity_feature_names(windows=VELOCITY_WINDOWS):
+    names = []
+    for w in windows:
+        names += [f'tx_count_{w}s', f'amount_sum_{w}s', f'amount_zscore_{w}s']
+    return names + ['seconds_since_prev']
+
+
+VELOCITY_FEATURES = velocity_feature_names()
+
+
+def _to_seconds(times):
+    """ Time ramené à la précision float32 (celle du cache colonnaire et du modèle) : mêmes fenêtres, quelle que soit la source """
+    return np.asarray(times, dtype=np.float32).astype(np.float64)
+
+
+def _to_cents(amounts):
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _window_stats(cents, count, total, squares):
+    """ (somme en €, z-score) à partir des agrégats entiers d'une fenêtre ; commun aux deux implémentations """
+    n = count.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total.astype(np.float64) / n
+        std = np.sqrt(np.maximum(squares.astype(np.float64) / n - mean * mean, 0.0))
+        zscore = (cents.astype(np.float64) - mean) / std
+    zscore = np.where((count >= 2) & (std > 0), zscore, 0.0)
+    return total.astype(np.float64) / 100, zscore
+
+
+def _gaps(times, previous_time=None):
+    gaps = np.empty(len(times))
+    gaps[1:] = np.diff(times)
+    if len(times):
+        gaps[0] = NO_PREVIOUS if previous_time is None else times[0] - previous_time
+    return gaps
+
+
+def _sorted_features(times, cents, windows):
+    """ Flux déjà trié par Time : une recherche dichotomique et deux sommes cumulées par fenêtre """
+    n = len(times)
+    out = np.empty((n, 3 * len(windows) + 1))
+    positions = np.arange(n)
+    cum = np.r_[0, np.cumsum(cents)]
+    cum_sq = np.r_[0, np.cumsum(cents * cents)]
+    for k, w in enumerate(windows):
+        # Première transaction encore dans la fenêtre : Time > t - w
+        start = np.searchsorted(times, times - w, side='right')
+        count = positions - start
+        total = cum[positions] - cum[start]
+        squares = cum_sq[positions] - cum_sq[start]
+        out[:, 3 * k] = count
+        out[:, 3 * k + 1], out[:, 3 * k + 2] = _window_stats(cents, count, total, squares)
+    out[:, -1] = _gaps(times)
+    return out
+
+
+def compute_velocity_features(times, amounts, windows=VELOCITY_WINDOWS):
+    """ Entraînement : features de vélocité de tout le flux (ordre d'origine des lignes conservé) """
+    times = _to_seconds(times)
+    order = np.argsort(times, kind='stable')
+    features = np.empty((len(times), 3 * len(windows) + 1))
+    features[order] = _sorted_features(times[order], _to_cents(amounts)[order], windows)
+    return pd.DataFrame(features, columns=velocity_feature_names(windows))
+
+
+def add_velocity_features(df, windows=VELOCITY_WINDOWS):
+    """ DataFrame au format creditcard.csv + colonnes de vélocité (float32, comme les autres features) """
+    features = compute_velocity_features(df['Time'], df['Amount'], windows).astype(np.float32)
+    features.index = df.index
+    return pd.concat([df, features], axis=1)
+
+
+class VelocityState:
+    """
+    État du flux pour le scoring en ligne : buffer circulaire des transactions encore dans la plus
+    grande fenêtre, et pour chaque fenêtre un pointeur de début + des agrégats entiers courants.
+    update() coûte O(1) amorti par événement ; update_batch() traite un bloc trié de façon vectorisée.
+    """
+
+    def __init__(self, windows=VELOCITY_WINDOWS, capacity=1024):
+        self.windows = tuple(windows)
+        self.times = np.empty(capacity)
+        self.cents = np.empty(capacity, dtype=np.int64)
+        self.start = 0                                  # indice absolu de la plus ancienne transaction gardée
+        self.end = 0                                    # indice absolu de la prochaine transaction
+        self.heads = [0] * len(self.windows)
+        self.totals = [0] * len(self.windows)
+        self.squares = [0] * len(self.windows)
+        self.last_time = None
+
+    @property
+    def feature_names(self):
+        return velocity_feature_names(self.windows)
+
+    def _slot(self, index):
+        return index % len(self.times)
+
+    def _push(self, times, cents):
+        """ Ajoute des transactions au buffer (capacité doublée si nécessaire, positions gardées modulo la taille) """
+        required = self.end - self.start + len(times)
+        if required > len(self.times):
+            live = np.arange(self.start, self.end)
+            old_times, old_cents = self.times[live % len(self.times)], self.cents[live % len(self.cents)]
+            capacity = len(self.times)
+            while capacity < required:
+                capacity *= 2
+            self.times = np.empty(capacity)
+            self.cents = np.empty(capacity, dtype=np.int64)
+            self.times[live % capacity] = old_times
+            self.cents[live % capacity] = old_cents
+        slots = np.arange(self.end, self.end + len(times)) % len(self.times)
+        self.times[slots] = times
+        self.cents[slots] = cents
+        self.end += len(times)
+
+    def _check_order(self, first_time):
+        if self.last_time is not None and first_time < self.last_time:
+            raise ValueError(f"Flux non trié par Time : {first_time} après {self.last_time}")
+
+    def validate(self, times):
+        """ Vérifie, sans modifier l'état, que `times` prolonge le flux dans l'ordre de Time """
+        times = _to_seconds(times)
+        if len(times):
+            if np.any(np.diff(times) < 0):
+                raise ValueError("Transactions non triées par Time")
+            self._check_order(times[0])
+
+    def update(self, time, amount):
+        """ Features de la transaction (à partir des précédentes), puis ajout au flux """
+        time = float(_to_seconds([time])[0])
+        self._check_order(time)
+        cents = int(_to_cents(amount))
+        counts, totals, squares = [], [], []
+        for k, w in enumerate(self.windows):
+            head = self.heads[k]
+            while head < self.end and self.times[self._slot(head)] <= time - w:
+                c = int(self.cents[self._slot(head)])
+                self.totals[k] -= c
+                self.squares[k] -= c * c
+                head += 1
+            self.heads[k] = head
+            counts.append(self.end - head)
+            totals.append(self.totals[k])
+            squares.append(self.squares[k])
+
+        total, zscore = _window_stats(np.full(len(self.windows), cents), np.array(counts),
+                                      np.array(totals, dtype=np.int64), np.array(squares, dtype=np.int64))
+        out = np.empty(3 * len(self.windows) + 1)
+        out[0:-1:3], out[1:-1:3], out[2:-1:3] = counts, total, zscore
+        out[-1] = _gaps(np.array([time]), self.last_time)[0]
+
+        for k in range(len(self.windows)):
+            self.totals[k] += cents
+            self.squares[k] += cents * cents
+        self._push([time], [cents])
+        self.start = min(self.heads)
+        self.last_time = time
+        return out
+
+    def update_batch(self, times, amounts):
+        """ Bloc trié par Time : calcul vectorisé sur [transactions gardées + bloc], puis mise à jour de l'état """
+        times = _to_seconds(times)
+        if not len(times):
+            return np.empty((0, 3 * len(self.windows) + 1))
+        if np.any(np.diff(times) < 0):
+            raise ValueError("Bloc non trié par Time")
+        self._check_order(times[0])
+        cents = _to_cents(amounts)
+
+        live = np.arange(self.start, self.end)
+        all_times = np.r_[self.times[live % len(self.times)], times]
+        all_cents = np.r_[self.cents[live % len(self.cents)], cents]
+        features = _sorted_features(all_times, all_cents, self.windows)[len(live):]
+        features[0, -1] = _gaps(times[:1], self.last_time)[0]
+
+        self._push(times, cents)
+        # Nouveaux débuts de fenêtre et agrégats recalculés sur les transactions restantes
+        self.last_time = float(times[-1])
+        live = np.arange(self.start, self.end)
+        live_times = self.times[live % len(self.times)]
+        live_cents = self.cents[live % len(self.cents)]
+        for k, w in enumerate(self.windows):
+            offset = int(np.searchsorted(live_times, self.last_time - w, side='right'))
+            self.heads[k] = self.start + offset
+            self.totals[k] = int(live_cents[offset:].sum())
+            self.squares[k] = int((live_cents[offset:] * live_cents[offset:]).sum())
+        self.start = min(self.heads)
+        return features